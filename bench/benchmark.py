@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from synthetic import generate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+BASELINES_PATH = os.path.join(BENCH_DIR, 'baselines.json')
+RAW_FILES = ['metadata.csv', 'reviews.csv', 'books_reviews_clean.csv']
+
+
+def pick_genre(at):
+    options = at.selectbox[1].options
+    at.selectbox[1].set_value(options[min(2, len(options) - 1)])
+
+
+def pick_authors(at):
+    at.multiselect[0].set_value(at.multiselect[0].options[:2])
+
+
+def pick_category(at):
+    at.multiselect[1].set_value(at.multiselect[1].options[:1])
+
+
+# Interactions replayed on each page; every step is one Streamlit rerun
+SCENARIOS = {
+    'dash1': ('dash1.py', [
+        ('year_range', lambda at: at.slider[0].set_value((1990, 2010))),
+        ('genre', pick_genre),
+        ('measure', lambda at: at.selectbox[0].set_value('Reviews')),
+    ]),
+    'dash2': (os.path.join('pages', 'dash2.py'), [
+        ('authors', pick_authors),
+        ('category', pick_category),
+    ]),
+}
+
+
+def prepare(scale, seed):
+    # Generated inputs are kept between runs; the pipeline is run with
+    # --no-download, so it uses them in place of the Kaggle files
+    workdir = os.path.join(DATA_DIR, f'scale-{scale:g}-seed-{seed}')
+    dataset_dir = os.path.join(workdir, 'dataset')
+    if not all(os.path.exists(os.path.join(dataset_dir, f)) for f in RAW_FILES):
+        print(f"Generating scale {scale:g} inputs in {dataset_dir}")
+        generate(dataset_dir, scale, seed)
+    return workdir
+
+
+def bench_pipeline(workdir, output_format, workers):
+    command = [sys.executable, os.path.join(REPO_DIR, 'dataprocessing.py'), '--force', '--no-download',
+               '--format', output_format, '--workers', str(workers)]
+    start = time.perf_counter()
+    subprocess.run(command, cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def bench_page(script, steps, repeats):
+    from streamlit.testing.v1 import AppTest
+
+    timings = {'cold': [], **{name: [] for name, _ in steps}}
+    for _ in range(repeats):
+        at = AppTest.from_file(os.path.join(REPO_DIR, script), default_timeout=600)
+        start = time.perf_counter()
+        at.run()
+        timings['cold'].append(time.perf_counter() - start)
+        for name, step in steps:
+            step(at)
+            start = time.perf_counter()
+            at.run()
+            timings[name].append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"{script} raised: {at.exception[0].value}")
+    # 'cold' is the first session's first run; later sessions reuse the shared caches
+    return {name: (values[0] if name == 'cold' else statistics.median(values)) for name, values in timings.items()}
+
+
+def bench_scale(scale, args):
+    import streamlit as st
+
+    workdir = prepare(scale, args.seed)
+    results = {'pipeline': bench_pipeline(workdir, args.format, args.workers)}
+
+    # The pages read ./dataset, so they run from the scale's working directory
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for page, (script, steps) in SCENARIOS.items():
+            for name, seconds in bench_page(script, steps, args.repeats).items():
+                results[f'{page}.{name}'] = seconds
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def compare(results, baselines, threshold, min_seconds):
+    # A metric regresses when it is slower than its baseline by more than
+    # `threshold` (relative) and `min_seconds` (absolute)
+    regressions = []
+    for scale, metrics in results.items():
+        for metric, seconds in metrics.items():
+            baseline = baselines.get(scale, {}).get(metric)
+            if baseline is not None and seconds > baseline * (1 + threshold) and seconds - baseline > min_seconds:
+                regressions.append((scale, metric, baseline, seconds))
+    return regressions
+
+
+def print_results(results, baselines):
+    print(f"\n{'scale':>6}  {'metric':<22}{'seconds':>10}{'baseline':>10}{'change':>9}")
+    for scale, metrics in results.items():
+        for metric, seconds in metrics.items():
+            baseline = baselines.get(scale, {}).get(metric)
+            change = f"{seconds / baseline - 1:+.0%}" if baseline else ''
+            shown = f"{baseline:.3f}" if baseline is not None else '-'
+            print(f"{scale:>6}  {metric:<22}{seconds:>10.3f}{shown:>10}{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline and dashboards on synthetic data")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10],
+                        help="dataset sizes as multiples of the Kaggle sample")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeats", type=int, default=3, help="sessions replayed per page")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="parquet")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown over the baseline that counts as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="absolute slowdown below which a change is treated as noise")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help=f"store this run's timings as the baselines in {BASELINES_PATH}")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_DIR)
+    results = {f'{scale:g}': bench_scale(scale, args) for scale in args.scales}
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)['scales']
+    print_results(results, baselines)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baselines:
+        baselines.update(results)
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump({'seed': args.seed, 'format': args.format, 'scales': baselines}, f, indent=2)
+        print(f"Baselines saved to {BASELINES_PATH}")
+        return
+
+    regressions = compare(results, baselines, args.threshold, args.min_seconds)
+    for scale, metric, baseline, seconds in regressions:
+        print(f"REGRESSION scale {scale} {metric}: {seconds:.3f}s vs baseline {baseline:.3f}s")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+from benchmark import REPO_DIR, BENCH_DIR, prepare, compare, print_results
+
+BASELINES_PATH = os.path.join(BENCH_DIR, 'loadtest_baselines.json')
+PERCENTILES = [50, 95, 99]
+
+
+# Interaction scripts. Each one changes a widget and yields the step name; the
+# session then reruns the page and times it. A session's choices come from its
+# own seeded generator, so a run replays the same interactions every time.
+def dash1_script(at, rng):
+    # Dragging the year slider reruns the page for a few intermediate positions
+    slider = at.slider[0]
+    start, end = slider.value
+    target = rng.randint(int(slider.min), start)
+    for step in range(1, 5):
+        at.slider[0].set_value((start + (target - start) * step // 4, end))
+        yield 'year_drag'
+    for measure in ['Reviews', 'Sales']:
+        at.selectbox[0].set_value(measure)
+        yield 'measure'
+    genres = at.selectbox[1].options
+    at.selectbox[1].set_value(rng.choice(genres[1:] or genres))
+    yield 'genre'
+    at.selectbox[1].set_value('All Genres')
+    yield 'genre'
+    at.slider[0].set_value((start, end))
+    yield 'year_drag'
+
+
+def dash2_script(at, rng):
+    authors = at.multiselect[0].options
+    at.multiselect[0].set_value(rng.sample(authors, min(len(authors), rng.randint(1, 2))))
+    yield 'authors'
+    categories = at.multiselect[1].options
+    if categories:
+        at.multiselect[1].set_value(rng.sample(categories, 1))
+        yield 'category'
+    if at.slider:
+        low, high = at.slider[0].value
+        at.slider[0].set_value((low + (high - low) / 4, high - (high - low) / 4))
+        yield 'date_range'
+    at.multiselect[1].set_value([])
+    yield 'category'
+    at.multiselect[0].set_value([])
+    yield 'authors'
+
+
+PAGES = {
+    'dash1': ('dash1.py', dash1_script),
+    'dash2': (os.path.join('pages', 'dash2.py'), dash2_script),
+}
+
+
+def run_session(page, seed, iterations, timings, errors):
+    from streamlit.testing.v1 import AppTest
+
+    script_path, script = PAGES[page]
+    rng = random.Random(seed)
+    at = AppTest.from_file(os.path.join(REPO_DIR, script_path), default_timeout=600)
+    start = time.perf_counter()
+    at.run()
+    timings.append((page, 'cold', time.perf_counter() - start))
+    for _ in range(iterations):
+        for step in script(at, rng):
+            start = time.perf_counter()
+            at.run()
+            timings.append((page, step, time.perf_counter() - start))
+            if at.exception:
+                errors.append(f"{page} {step}: {at.exception[0].value}")
+                return
+
+
+def worker(args):
+    # One dashboard process: its sessions are threads sharing the process's caches,
+    # as the sessions of one Streamlit server are
+    sys.path.insert(0, REPO_DIR)
+    from profiling import peak_rss_bytes
+
+    timings, errors, threads = [], [], []
+    for i in range(args.sessions):
+        page = args.pages[i % len(args.pages)]
+        seed = args.seed * 1000 + args.worker_id * 100 + i
+        threads.append(threading.Thread(target=run_session, args=(page, seed, args.iterations, timings, errors)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = {'timings': timings, 'errors': errors, 'wall_s': time.perf_counter() - start,
+              'peak_rss_bytes': peak_rss_bytes()}
+    with open(args.result, 'w') as f:
+        json.dump(result, f)
+
+
+def run_processes(workdir, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        procs, paths = [], []
+        for worker_id in range(args.processes):
+            path = os.path.join(tmp, f'worker-{worker_id}.json')
+            command = [sys.executable, os.path.abspath(__file__), '--worker', '--worker-id', str(worker_id),
+                       '--result', path, '--sessions', str(args.sessions), '--iterations', str(args.iterations),
+                       '--seed', str(args.seed), '--pages', *args.pages]
+            procs.append(subprocess.Popen(command, cwd=workdir, stderr=subprocess.DEVNULL))
+            paths.append(path)
+        for proc in procs:
+            if proc.wait() != 0:
+                raise RuntimeError(f"load test worker exited with {proc.returncode}")
+        results = []
+        for path in paths:
+            with open(path) as f:
+                results.append(json.load(f))
+    return results
+
+
+def summarize(results):
+    # Latency percentiles per page over every warm rerun of every session, plus
+    # throughput over the whole run and each process's peak memory
+    metrics = {}
+    latencies = {page: [] for page in PAGES}
+    for result in results:
+        for page, step, seconds in result['timings']:
+            if step != 'cold':
+                latencies[page].append(seconds)
+    latencies['all'] = [seconds for values in latencies.values() for seconds in values]
+    for page, values in latencies.items():
+        if not values:
+            continue
+        for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            metrics[f'{page}.p{p}'] = float(value)
+    wall = max(result['wall_s'] for result in results)
+    reruns = sum(len(result['timings']) for result in results)
+    summary = {
+        'reruns': reruns,
+        'throughput_per_s': reruns / wall if wall else 0.0,
+        'peak_rss_bytes': [result['peak_rss_bytes'] for result in results],
+        'errors': [error for result in results for error in result['errors']],
+    }
+    return metrics, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent dashboard sessions on synthetic data")
+    parser.add_argument("--scale", type=float, default=1, help="dataset size as a multiple of the Kaggle sample")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--processes", type=int, default=1, help="dashboard processes run side by side")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions per process")
+    parser.add_argument("--iterations", type=int, default=2, help="times each session replays its script")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES),
+                        help="pages the sessions are spread over")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown over the baseline that counts as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="absolute slowdown below which a change is treated as noise")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help=f"store this run's latencies as the baselines in {BASELINES_PATH}")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-id", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    # The pipeline only rebuilds what changed since the last run on this data
+    workdir = prepare(args.scale, args.seed)
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, 'dataprocessing.py'), '--format', 'parquet', '--no-download'],
+                   cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+
+    print(f"Replaying {args.processes} x {args.sessions} sessions on scale {args.scale:g} data")
+    metrics, summary = summarize(run_processes(workdir, args))
+    scale = f'{args.scale:g}'
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)['scales']
+    print_results({scale: metrics}, baselines)
+    print(f"\n{summary['reruns']} reruns, {summary['throughput_per_s']:.1f} reruns/s")
+    for i, peak in enumerate(summary['peak_rss_bytes']):
+        shown = f"{peak / 2**20:,.0f} MiB" if peak is not None else 'n/a'
+        print(f"process {i}: peak memory {shown}")
+    for error in summary['errors']:
+        print(f"ERROR {error}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'scale': scale, 'metrics': metrics, **summary}, f, indent=2)
+
+    if summary['errors']:
+        sys.exit(1)
+
+    if args.update_baselines:
+        baselines[scale] = metrics
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump({'seed': args.seed, 'processes': args.processes, 'sessions': args.sessions,
+                       'scales': baselines}, f, indent=2)
+        print(f"Baselines saved to {BASELINES_PATH}")
+        return
+
+    regressions = compare({scale: metrics}, baselines, args.threshold, args.min_seconds)
+    for scale, metric, baseline, seconds in regressions:
+        print(f"REGRESSION scale {scale} {metric}: {seconds:.3f}s vs baseline {baseline:.3f}s")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Scale 1 matches the Kaggle sample: 20k books and 727k reviews
+BOOKS_PER_SCALE = 20_000
+REVIEWS_PER_SCALE = 727_000
+CHUNK_SIZE = 250_000
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+               'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+               'Daniel', 'Nancy', 'Matthew', 'Lisa', 'Anthony', 'Margaret', 'Mark', 'Sandra', 'Paul', 'Ashley',
+               'Steven', 'Emily', 'Andrew', 'Donna', 'Kenneth', 'Michelle', 'George', 'Carol', 'Brian', 'Amanda']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+              'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson', 'Walker',
+              'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Flores', 'Green',
+              'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell', 'Mitchell', 'Carter', 'Roberts', 'Gomez']
+GENRES = ['Literature & Fiction', 'Mystery, Thriller & Suspense', 'Romance', 'Science Fiction & Fantasy',
+          "Children's Books", 'Biographies & Memoirs', 'History', 'Self-Help', 'Religion & Spirituality',
+          'Business & Money', 'Teen & Young Adult', 'Health, Fitness & Dieting', 'Cookbooks, Food & Wine',
+          'Politics & Social Sciences', 'Arts & Photography', 'Comics & Graphic Novels', 'Humor & Entertainment',
+          'Crafts, Hobbies & Home', 'Parenting & Relationships', 'Science & Math', 'Sports & Outdoors',
+          'Travel', 'Education & Teaching', 'Computers & Technology', 'Reference', 'Law', 'Medical Books',
+          'Engineering & Transportation']
+FORMATS = ['Paperback', 'Hardcover', 'Kindle', None, 'Mass Market Paperback']
+FORMAT_WEIGHTS = [0.45, 0.25, 0.15, 0.1, 0.05]
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December']
+EDITIONS = ['Reprint', 'Illustrated edition', '1st edition', 'Revised edition', 'Anniversary edition']
+RATING_WEIGHTS = [0.06, 0.05, 0.09, 0.2, 0.6]
+STOPWORDS = {'the', 'and', 'a', 'to', 'of', 'i', 'it', 'is', 'in', 'this', 'was', 'that', 'for', 'but', 'with'}
+WORDS = (
+    'the and a to of i it is in this was that for but with book story read characters loved great author '
+    'series plot ending writing really good well one recommend enjoyed time first would could page novel '
+    'life love world family slow boring long interesting fun funny sad beautiful written character end '
+    'chapter better best new way never little much still reading history mystery romance twist suspense '
+    'predictable disappointing amazing wonderful favorite heart dark light war young old kids children '
+    'audio kindle paperback copy price gift daughter son wife husband friend finished couldn put down '
+).split()
+
+
+def zipf_weights(n, s):
+    # Popularity that falls off with rank, so a few keys dominate like in the real data
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return weights / weights.sum()
+
+
+def author_names(n):
+    first = np.array(FIRST_NAMES, dtype=object)
+    last = np.array(LAST_NAMES, dtype=object)
+    i = np.arange(n)
+    names = first[i % len(first)] + ' ' + np.array([chr(65 + c) for c in range(26)], dtype=object)[i // len(first) % 26] \
+        + '. ' + last[i // (len(first) * 26) % len(last)]
+    # Past the unique combinations, tell namesakes apart with a suffix
+    repeat = i // (len(first) * 26 * len(last))
+    return np.where(repeat > 0, names + ' ' + repeat.astype(str), names)
+
+
+def publisher_dates(rng, n, publishers):
+    # Same shapes as the Kaggle column, e.g. 'Penguin; Reprint edition (May 5, 2020'
+    years = np.maximum(2023 - np.floor(rng.exponential(12, n)), 1900).astype(int).astype(str)
+    months = np.array(MONTHS, dtype=object)[rng.integers(0, 12, n)]
+    days = rng.integers(1, 29, n).astype(str)
+    editions = np.array(EDITIONS, dtype=object)[rng.integers(0, len(EDITIONS), n)]
+    full = months + ' ' + days + ', ' + years
+    kind = rng.random(n)
+    dates = np.select(
+        [kind < 0.55, kind < 0.85, kind < 0.92, kind < 0.96],
+        [publishers + ' (' + full, publishers + '; ' + editions + ' (' + full,
+         publishers + ' (' + years, years],
+        default=None,
+    )
+    return np.where(kind < 0.98, dates, None)
+
+
+def generate_metadata(rng, n_books):
+    authors = author_names(max(1, n_books // 2))
+    publishers = np.array([f'{LAST_NAMES[i % len(LAST_NAMES)]} {["Press", "Books", "House", "Publishing"][i // len(LAST_NAMES) % 4]}'
+                           + (f' {i // (len(LAST_NAMES) * 4)}' if i >= len(LAST_NAMES) * 4 else '')
+                           for i in range(max(1, n_books // 20))], dtype=object)
+
+    author = authors[rng.choice(len(authors), n_books, p=zipf_weights(len(authors), 0.9))]
+    publisher = publishers[rng.choice(len(publishers), n_books, p=zipf_weights(len(publishers), 1.1))]
+    genre = np.array(GENRES, dtype=object)[rng.choice(len(GENRES), n_books, p=zipf_weights(len(GENRES), 1.0))]
+    price = np.round(rng.lognormal(2.6, 0.6, n_books), 2)
+    # Unique 10-digit ids, scattered and with leading zeros like ISBN-10s
+    parent_asin = np.char.zfill(((np.arange(n_books) * 7919 + 104729) % 10**10).astype(str), 10).astype(object)
+
+    metadata = pd.DataFrame({
+        'title': [f'{w1.title()} {w2.title()} {i}' for i, (w1, w2) in
+                  enumerate(zip(rng.choice(WORDS[15:], n_books), rng.choice(WORDS[15:], n_books)))],
+        'subtitle': None,
+        'author_name': np.where(rng.random(n_books) < 0.02, None, author),
+        'author_about': 'About the author',
+        'publisher': np.where(rng.random(n_books) < 0.05, None, publisher),
+        'publisher_date': publisher_dates(rng, n_books, publisher),
+        'format': np.array(FORMATS, dtype=object)[rng.choice(len(FORMATS), n_books, p=FORMAT_WEIGHTS)],
+        'page_count': np.where(rng.random(n_books) < 0.1, np.nan, np.round(rng.lognormal(5.6, 0.5, n_books))),
+        'language': 'English',
+        'isbn_10': None,
+        'isbn_13': None,
+        'main_category': 'Books',
+        'category_level_1_main': 'Books',
+        'category_level_2_sub': genre,
+        'category_level_3_detail': np.where(rng.random(n_books) < 0.05, None, genre),
+        'average_rating': np.round(1 + 4 * rng.beta(5, 1.5, n_books), 1),
+        'rating_number': np.floor(rng.pareto(1.2, n_books) * 20),
+        'price': price,
+        'price_numeric': np.where(rng.random(n_books) < 0.1, np.nan, price),
+        'description': 'A "synthetic" description,\nspanning two lines',
+        'features_text': None,
+        'dimensions': '5.5 x 0.8 x 8.5 inches',
+        'item_weight': '8.8 ounces',
+        'images': '[]',
+        'videos': '[]',
+        'store': author,
+        'parent_asin': parent_asin,
+        'bought_together': None,
+    })
+    return metadata
+
+
+def review_texts(rng, n):
+    lengths = np.clip(rng.lognormal(3.2, 0.7, n).astype(int), 3, 400)
+    words = np.array(WORDS, dtype=object)[rng.choice(len(WORDS), lengths.sum(), p=zipf_weights(len(WORDS), 1.05))]
+    chunks = np.split(words, np.cumsum(lengths)[:-1])
+    texts = [' '.join(chunk) for chunk in chunks]
+    clean = [' '.join(w for w in chunk if w not in STOPWORDS) for chunk in chunks]
+    return texts, clean
+
+
+def generate_reviews(rng, metadata, popularity, n_reviews):
+    # Review counts per book are heavily skewed; recent years get more reviews
+    book = rng.choice(len(metadata), n_reviews, p=popularity)
+    rating = rng.choice(5, n_reviews, p=RATING_WEIGHTS) + 1
+    start, end = pd.Timestamp('2000-01-01').value // 10**6, pd.Timestamp('2023-09-01').value // 10**6
+    timestamp = (end - (end - start) * rng.beta(1, 3, n_reviews)).astype(np.int64)
+    date = pd.to_datetime(timestamp, unit='ms')
+    text, clean_text = review_texts(rng, n_reviews)
+    asin = metadata['parent_asin'].to_numpy()[book]
+
+    reviews = pd.DataFrame({
+        'rating': rating.astype(float),
+        'title': np.array(['Great read', 'Loved it', 'Disappointing', 'Not for me', 'Five Stars', 'Good book'],
+                          dtype=object)[rng.integers(0, 6, n_reviews)],
+        'text': text,
+        'images': '[]',
+        'asin': asin,
+        'parent_asin': asin,
+        'user_id': np.char.add('U', rng.integers(0, max(1, n_reviews // 3), n_reviews).astype(str)),
+        'timestamp': timestamp,
+        'helpful_vote': rng.geometric(0.5, n_reviews) - 1,
+        'verified_purchase': rng.random(n_reviews) < 0.7,
+        'date': date,
+        'year': date.year,
+    })
+    clean = reviews.assign(
+        author_name=metadata['author_name'].to_numpy()[book],
+        category_level_3_detail=metadata['category_level_3_detail'].to_numpy()[book],
+        clean_text=clean_text,
+        sentiment_rating=np.where(rating >= 4, 2, np.where(rating <= 2, 0, 1)),
+    )
+    return reviews, clean
+
+
+def generate(outdir, scale=1.0, seed=42):
+    # Writes metadata.csv, reviews.csv and books_reviews_clean.csv with the schemas of
+    # the Kaggle files. The same seed and scale always produce the same files.
+    os.makedirs(outdir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_books = max(1, int(BOOKS_PER_SCALE * scale))
+    n_reviews = max(1, int(REVIEWS_PER_SCALE * scale))
+
+    metadata = generate_metadata(rng, n_books)
+    metadata.to_csv(os.path.join(outdir, 'metadata.csv'), index=False)
+    popularity = zipf_weights(n_books, 1.05)[rng.permutation(n_books)]
+
+    # Reviews are written in chunks so memory stays flat at large scales
+    reviews_path = os.path.join(outdir, 'reviews.csv')
+    clean_path = os.path.join(outdir, 'books_reviews_clean.csv')
+    for i, start in enumerate(range(0, n_reviews, CHUNK_SIZE)):
+        reviews, clean = generate_reviews(rng, metadata, popularity, min(CHUNK_SIZE, n_reviews - start))
+        reviews.to_csv(reviews_path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+        clean.to_csv(clean_path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+    return n_books, n_reviews
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic raw datasets")
+    parser.add_argument("outdir", help="directory to write the CSV files to")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiple of the Kaggle sample size (20k books, 727k reviews)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    n_books, n_reviews = generate(args.outdir, args.scale, args.seed)
+    print(f"Wrote {n_books} books and {n_reviews} reviews to {args.outdir}")
+
+
+if __name__ == "__main__":
+    main()
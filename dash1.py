@@ -2,9 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import os
+from datastore import load_table, store_version, shared_dictionaries, compact, memory_report
+from yearindex import YearIndex, YearSlices
+from figcache import FigureCache
+from topk import TopK
+from timings import RerunTimer
 
 st.set_page_config(page_title="Books Dashboard", layout="wide")
+timer = RerunTimer('dash1')
 st.title("Amazon Books Dashboard")
 
 # Hide Streamlit sidebar page navigation
@@ -23,25 +28,84 @@ section[data-testid="stSidebar"] {
 """, unsafe_allow_html=True)
 
 
-# Load data (cache busts when files change)
-@st.cache_data
-def load_data(cache_bust: tuple):
+# Year-indexed views of every aggregate, built once per store version and shared by all
+# sessions. Moving the year slider only does binary searches and prefix-sum subtractions.
+@st.cache_resource(max_entries=2)
+def load_year_store(version: str):
+    scorecard = load_table('scorecard_data', ['year', 'total_books', 'total_reviews', 'total_sales'], version=version)
+    genre = load_table('genre_data', ['year', 'genre', 'review_count', 'total_sales'], version=version)
+    books = load_table('top_books_data', ['year', 'title', 'author_name', 'genre', 'total_reviews', 'total_sales'], version=version)
+    authors = load_table('top_authors_data', ['year', 'author_name', 'total_reviews', 'total_sales'], version=version)
+    author_genres = load_table('author_genre_data', ['year', 'author_name', 'genre', 'total_reviews', 'total_sales'], version=version)
+    publishers = load_table('top_publishers_data', ['year', 'publisher_name', 'genre', 'total_reviews', 'total_sales', 'avg_rating'],
+                            version=version)
+    formats = load_table('format_data', ['year', 'book_format', 'genre', 'avg_price', 'book_count', 'total_reviews', 'total_sales'],
+                         version=version)
+    rankings = load_table('rankings', ['kind', 'genre', 'year', 'title', 'author_name', 'publisher_name',
+                                       'total_reviews', 'total_sales', 'sales_rank', 'reviews_rank'], version=version)
+
+    # Titles, names, genres and formats are held as codes against dictionaries shared by every table
+    frames = [scorecard, genre, books, authors, author_genres, publishers, formats, rankings]
+    dictionaries = shared_dictionaries(frames, ['title', 'author_name', 'genre', 'publisher_name', 'book_format'])
+    scorecard, genre, books, authors, author_genres, publishers, formats, rankings = (compact(df, dictionaries) for df in frames)
+
+    publishers['weighted_rating'] = publishers['avg_rating'] * publishers['total_reviews']
+    all_formats = formats[formats['book_format'] == 'All Formats']
+    by_format = formats[formats['book_format'] != 'All Formats']
+    # Genre price line: book-count weighted average of the per-format prices
+    weighted = by_format.assign(wsum=by_format['avg_price'] * by_format['book_count'])
+    genre_price = weighted.groupby(['genre', 'year'], observed=True)[['wsum', 'book_count']].sum().reset_index()
+    genre_price['avg_price'] = (genre_price['wsum'] / genre_price['book_count']).fillna(0)
+
+    measures = ['total_reviews', 'total_sales']
+    format_values = measures + ['avg_price']
+    publisher_values = measures + ['weighted_rating']
+    books_index = YearIndex(books, ['title', 'author_name'], measures)
+    books_by_genre = YearIndex(books, ['title', 'author_name'], measures, partition='genre')
+    authors_index = YearIndex(authors, ['author_name'], measures)
+    authors_by_genre = YearIndex(author_genres, ['author_name'], measures, partition='genre')
+    publishers_index = YearIndex(publishers, ['publisher_name'], publisher_values)
+    publishers_by_genre = YearIndex(publishers, ['publisher_name'], publisher_values, partition='genre')
+
+    # Top-k lists merge the pipeline's per-year rankings; genre is null in the all-genre rankings
+    ranks = {'total_sales': 'sales_rank', 'total_reviews': 'reviews_rank'}
+    def ranked(kind, by_genre):
+        return rankings[(rankings['kind'] == kind) & (rankings['genre'].notna() == by_genre)]
+
     return {
-        'scorecard': pd.read_csv('./dataset/scorecard_data.csv'),
-        'genre': pd.read_csv('./dataset/genre_data.csv'),
-        'books': pd.read_csv('./dataset/top_books_data.csv'),
-        'authors': pd.read_csv('./dataset/top_authors_data.csv'),
-        'publishers': pd.read_csv('./dataset/top_publishers_data.csv')
+        'scorecard': YearSlices(scorecard),
+        'genre': YearIndex(genre, ['genre'], ['review_count', 'total_sales']),
+        'genre_rows': YearSlices(genre.fillna({'review_count': 0, 'total_sales': 0}), order=['genre']),
+        'top_books': TopK(books_index, ranked('book', False), ranks),
+        'top_books_by_genre': TopK(books_by_genre, ranked('book', True), ranks, partition='genre'),
+        'top_authors': TopK(authors_index, ranked('author', False), ranks),
+        'top_authors_by_genre': TopK(authors_by_genre, ranked('author', True), ranks, partition='genre'),
+        'top_publishers': TopK(publishers_index, ranked('publisher', False), ranks),
+        'top_publishers_by_genre': TopK(publishers_by_genre, ranked('publisher', True), ranks, partition='genre'),
+        'formats': YearIndex(by_format, ['book_format'], format_values),
+        'formats_by_genre': YearIndex(by_format, ['book_format'], format_values, partition='genre'),
+        'format_rows': YearSlices(by_format, order=['book_format']),
+        'format_rows_by_genre': YearSlices(by_format, partition='genre', order=['book_format']),
+        'all_formats': YearSlices(all_formats),
+        'genre_price': YearSlices(genre_price, partition='genre'),
     }
 
-data = load_data((
-    os.path.getmtime('./dataset/scorecard_data.csv'),
-    os.path.getmtime('./dataset/genre_data.csv'),
-    os.path.getmtime('./dataset/top_books_data.csv'),
-    os.path.getmtime('./dataset/top_authors_data.csv'),
-    os.path.getmtime('./dataset/top_publishers_data.csv')
-))
-scorecard, genre_data, top_books_data, top_authors_data, top_publishers_data = data['scorecard'], data['genre'], data['books'], data['authors'], data['publishers']
+# Built figures, shared by all sessions; see cached_figure below
+@st.cache_resource
+def figure_cache():
+    return FigureCache(max_entries=256)
+
+version = store_version()
+with timer.section('load_year_store'):
+    store = load_year_store(version)
+
+def by_genre(name, genre):
+    # Returns (index, partition) for a query that may be restricted to one genre
+    if genre == "All Genres":
+        return store[name], None
+    return store[f'{name}_by_genre'], genre
+
+year_bounds = store['scorecard'].frame['year']
 
 # Initialize session state
 if 'selected_genre' not in st.session_state:
@@ -69,30 +133,53 @@ def create_sparkline_chart(data, y_col):
     fig.update_yaxes(showgrid=False)
     return fig
 
-def filter_by_year(df, year_range):
-    return (df['year'] >= year_range[0]) & (df['year'] <= year_range[1])
-
 # Filters
 filter_col1, filter_col2, filter_col3 = st.columns(3)
 
 with filter_col1:
-    year_range = st.slider("Published Year", int(scorecard['year'].min()), int(scorecard['year'].max()), 
-                           (2000, int(scorecard['year'].max())))
+    year_range = st.slider("Published Year", int(year_bounds.min()), int(year_bounds.max()), 
+                           (2000, int(year_bounds.max())))
 
 with filter_col2:
     measure = st.selectbox("Measure for Top N Charts", ["Sales", "Reviews"], index=0)
 
 with filter_col3:
-    filtered_genre_for_options = genre_data[filter_by_year(genre_data, year_range)]
-    all_genres = sorted([g for g in filtered_genre_for_options['genre'].unique() if pd.notna(g)])
+    all_genres = store['genre'].totals(year_range)['genre'].tolist()
     genre_options = ["All Genres"] + all_genres
     current_idx = genre_options.index(st.session_state.selected_genre) if st.session_state.selected_genre in genre_options else 0
     st.selectbox("Filter by Genre", genre_options, index=current_idx, key="genre_filter", 
                  on_change=lambda: st.session_state.update({'selected_genre': st.session_state.genre_filter}))
     st.session_state.selected_genre = st.session_state.get('genre_filter', "All Genres")
 
+# Filter inputs read by each section of the page. A section's figures are cached
+# under just those inputs, so an interaction only rebuilds the sections that use
+# the filter that changed; the rest are served from the cache shared by all sessions.
+SECTION_INPUTS = {
+    'scorecards': ['year_range'],
+    'format_mix': ['year_range', 'measure', 'genre'],
+    'format_prices': ['year_range', 'genre'],
+    'publishers': ['year_range', 'measure', 'genre'],
+    'top_charts': ['year_range', 'measure', 'genre'],
+    'genre_analysis': ['year_range', 'measure'],
+}
+filters = {'year_range': tuple(year_range), 'measure': measure,
+           'genre': st.session_state.get('selected_genre', "All Genres")}
+
+def cached_figure(section, name, build):
+    state = tuple(filters[input_name] for input_name in SECTION_INPUTS[section])
+    built = []
+    def build_once():
+        built.append(True)
+        return build()
+    with timer.section(f'{section}/{name}') as timed:
+        figure = figure_cache().get_or_build((section, name, version) + state, build_once)
+        timed.note(cache='miss' if built else 'hit')
+    return figure
+
 # Display key metrics
-filtered_scorecard = scorecard[filter_by_year(scorecard, year_range)]
+with timer.section('filter/scorecard') as timed:
+    filtered_scorecard = store['scorecard'].rows(year_range)
+    timed.note(rows=len(filtered_scorecard))
 col1, col2, col3 = st.columns(3)
 
 for idx, (col, label, value_col, fmt) in enumerate([(col1, "Total Books", "total_books", "{:,.0f}"),
@@ -104,21 +191,17 @@ for idx, (col, label, value_col, fmt) in enumerate([(col1, "Total Books", "total
             val = filtered_scorecard[value_col].sum()
             st.metric(label, fmt.format(val))
         with c_col:
-            st.plotly_chart(create_sparkline_chart(filtered_scorecard, value_col), config={'responsive': True})
-
-# Load format analysis data (cache busts when file changes)
-@st.cache_data
-def load_format_data(cache_bust: float):
-    return pd.read_csv('./dataset/format_data.csv')
-
-format_data = load_format_data(os.path.getmtime('./dataset/format_data.csv'))
+            sparkline = cached_figure('scorecards', f'sparkline_{value_col}',
+                                      lambda: create_sparkline_chart(filtered_scorecard, value_col))
+            st.plotly_chart(sparkline, config={'responsive': True})
 
 # Book Format Analysis Section
 st.subheader("Book Format Analysis")
-filtered_format = format_data[filter_by_year(format_data, year_range)].copy()
 selected_genre = st.session_state.get('selected_genre', "All Genres")
-if selected_genre != "All Genres":
-    filtered_format = filtered_format[filtered_format['genre'] == selected_genre]
+format_index, format_part = by_genre('formats', selected_genre)
+with timer.section('filter/formats') as timed:
+    format_totals = format_index.totals(year_range, format_part)
+    timed.note(rows=len(format_totals))
 
 col_format_comparison, col_format_trends = st.columns([0.3, 0.6])
 
@@ -129,71 +212,72 @@ with col_format_comparison:
     # Determine which column to use for waterfall chart based on measure
     waterfall_col = 'total_reviews' if measure == 'Reviews' else 'total_sales'
     
-    # Waterfall chart: Measure by format (aggregated across all years)
-    format_measure_agg = filtered_format[filtered_format['book_format'] != 'All Formats'].copy()
-    format_measure_agg = format_measure_agg.groupby('book_format').agg({waterfall_col: 'sum'}).reset_index()
-    format_measure_agg = format_measure_agg.sort_values(waterfall_col, ascending=False)
+    def build_waterfall():
+        # Waterfall chart: Measure by format (aggregated across all years)
+        format_measure_agg = format_totals[['book_format', waterfall_col]].sort_values(waterfall_col, ascending=False)
     
-    def format_waterfall_value(val):
-        if measure == 'Sales':
-            if val < 1000:
-                return f'${val:.0f}'
-            elif val < 1e6:
-                return f'${val/1e3:.1f}K'
-            else:
-                return f'${val/1e6:.1f}M'
-        else:
-            if val < 1000:
-                return f'{val:.0f}'
+        def format_waterfall_value(val):
+            if measure == 'Sales':
+                if val < 1000:
+                    return f'${val:.0f}'
+                elif val < 1e6:
+                    return f'${val/1e3:.1f}K'
+                else:
+                    return f'${val/1e6:.1f}M'
             else:
-                return f'{val/1e3:.0f}K'
+                if val < 1000:
+                    return f'{val:.0f}'
+                else:
+                    return f'{val/1e3:.0f}K'
+    
+        # Create waterfall data with cumulative and total
+        formats = format_measure_agg['book_format'].tolist()
+        values = format_measure_agg[waterfall_col].tolist()
     
-    # Create waterfall data with cumulative and total
-    formats = format_measure_agg['book_format'].tolist()
-    values = format_measure_agg[waterfall_col].tolist()
+        # Prepare data for waterfall
+        x_data = formats + ['Total']
+        y_data = values + [sum(values)]
+        measure_type = ['relative'] * len(formats) + ['total']
     
-    # Prepare data for waterfall
-    x_data = formats + ['Total']
-    y_data = values + [sum(values)]
-    measure_type = ['relative'] * len(formats) + ['total']
+        # Default Plotly colors for consistency with line chart
+        plotly_colors = px.colors.qualitative.Plotly
     
-    # Default Plotly colors for consistency with line chart
-    plotly_colors = px.colors.qualitative.Plotly
+        fig_waterfall = go.Figure(go.Waterfall(
+            x=x_data, 
+            y=y_data, 
+            measure=measure_type,
+            increasing={"marker": {"color": "#3182BD"}},
+            decreasing={"marker": {"color": "#3182BD"}},
+            totals={"marker": {"color": "#003f87"}},
+            connector={"line": {"color": "rgba(0, 0, 0, 0.2)"}}
+        ))
     
-    fig_waterfall = go.Figure(go.Waterfall(
-        x=x_data, 
-        y=y_data, 
-        measure=measure_type,
-        increasing={"marker": {"color": "#3182BD"}},
-        decreasing={"marker": {"color": "#3182BD"}},
-        totals={"marker": {"color": "#003f87"}},
-        connector={"line": {"color": "rgba(0, 0, 0, 0.2)"}}
-    ))
+        fig_waterfall.update_layout(
+            title=f'{format_cols["label"]} by Format',
+            height=380, margin=dict(l=20, r=20, t=40, b=80),
+            title_font=dict(size=14), showlegend=False
+        )
     
-    fig_waterfall.update_layout(
-        title=f'{format_cols["label"]} by Format',
-        height=380, margin=dict(l=20, r=20, t=40, b=80),
-        title_font=dict(size=14), showlegend=False
-    )
+        # Extend y-axis to prevent label cutoff
+        fig_waterfall.update_yaxes(automargin=True, showgrid=False)
+        fig_waterfall.update_xaxes(showgrid=False)
     
-    # Extend y-axis to prevent label cutoff
-    fig_waterfall.update_yaxes(automargin=True, showgrid=False)
-    fig_waterfall.update_xaxes(showgrid=False)
+        # Add custom text labels with formatted values and percentages
+        total_val = sum(values)
+        text_labels = [f"{format_waterfall_value(v)}<br>({(v/total_val)*100:.1f}%)" for v in values]
+        text_labels.append(f"{format_waterfall_value(total_val)}")
     
-    # Add custom text labels with formatted values and percentages
-    total_val = sum(values)
-    text_labels = [f"{format_waterfall_value(v)}<br>({(v/total_val)*100:.1f}%)" for v in values]
-    text_labels.append(f"{format_waterfall_value(total_val)}")
+        fig_waterfall.data[0].text = text_labels
+        fig_waterfall.data[0].textposition = 'inside'
+        fig_waterfall.update_traces(textfont=dict(color='white'))
     
-    fig_waterfall.data[0].text = text_labels
-    fig_waterfall.data[0].textposition = 'inside'
-    fig_waterfall.update_traces(textfont=dict(color='white'))
+        return fig_waterfall
     
-    st.plotly_chart(fig_waterfall, config={'responsive': True})
+    st.plotly_chart(cached_figure('format_mix', 'waterfall', build_waterfall), config={'responsive': True})
     
     # Scorecards for each format
-    format_stats = filtered_format[filtered_format['book_format'] != 'All Formats'].copy()
-    format_stats = format_stats.groupby('book_format').agg({'avg_price': 'mean'}).reset_index()
+    format_stats = pd.DataFrame({'book_format': format_totals['book_format'],
+                                 'avg_price': format_totals['avg_price'] / format_totals['rows']})
     format_stats = format_stats.sort_values('avg_price', ascending=False)
     
     score_col1, score_col2, score_col3 = st.columns(3)
@@ -207,106 +291,116 @@ with col_format_trends:
     format_measure_col = 'avg_price'
     format_axis_label = 'Average Price ($)'
     
-    # Compute All Formats by year; if a genre is selected, derive it from formats via weighted avg
-    if selected_genre == "All Genres":
-        price_by_year = format_data[(format_data['book_format'] == 'All Formats') & filter_by_year(format_data, year_range)].sort_values('year')
-        y_series = price_by_year[format_measure_col]
-        x_series = price_by_year['year']
-    else:
-        tmp = filtered_format[filtered_format['book_format'] != 'All Formats']
-        wsum = (tmp['avg_price'] * tmp['book_count']).groupby(tmp['year']).sum()
-        wden = tmp.groupby('year')['book_count'].sum()
-        price_by_year = pd.DataFrame({'year': wsum.index, 'avg_price': (wsum / wden).fillna(0)})
-        y_series = price_by_year['avg_price']
-        x_series = price_by_year['year']
-    fig_price = px.line(x=x_series, y=y_series, 
-                        title='All Formats', markers=True)
-    fig_price.update_layout(height=220, margin=dict(l=20, r=20, t=40, b=20), 
-                           title_font=dict(size=14), showlegend=True, 
-                           legend=dict(orientation="h", yanchor="top", y=1.15, xanchor="left", x=0))
-    fig_price.update_yaxes(title_text=format_axis_label, showgrid=False)
-    fig_price.update_xaxes(title_text='Year', showgrid=False)
-    fig_price.update_traces(hovertemplate='Year: %{x}<br>Avg Price: $%{y:.2f}<extra></extra>')
-    st.plotly_chart(fig_price, config={'responsive': True}, use_container_width=True)
+    def build_price_chart():
+        # Compute All Formats by year; if a genre is selected, derive it from formats via weighted avg
+        if selected_genre == "All Genres":
+            price_by_year = store['all_formats'].rows(year_range)
+            y_series = price_by_year[format_measure_col]
+            x_series = price_by_year['year']
+        else:
+            price_by_year = store['genre_price'].rows(year_range, selected_genre)
+            y_series = price_by_year['avg_price']
+            x_series = price_by_year['year']
+        fig_price = px.line(x=x_series, y=y_series, 
+                            title='All Formats', markers=True)
+        fig_price.update_layout(height=220, margin=dict(l=20, r=20, t=40, b=20), 
+                               title_font=dict(size=14), showlegend=True, 
+                               legend=dict(orientation="h", yanchor="top", y=1.15, xanchor="left", x=0))
+        fig_price.update_yaxes(title_text=format_axis_label, showgrid=False)
+        fig_price.update_xaxes(title_text='Year', showgrid=False)
+        fig_price.update_traces(hovertemplate='Year: %{x}<br>Avg Price: $%{y:.2f}<extra></extra>')
+        return fig_price
+    
+    st.plotly_chart(cached_figure('format_prices', 'price', build_price_chart), config={'responsive': True}, use_container_width=True)
     
     # Line chart 2: Average price by year broken down by format
-    format_lines = filtered_format[filtered_format['book_format'] != 'All Formats'].copy()
-    format_lines = format_lines.sort_values(['year', 'book_format'])
-    fig_format_lines = px.line(format_lines, x='year', y=format_measure_col, color='book_format',
-                              title='By Format', markers=True)
-    fig_format_lines.update_layout(height=220, margin=dict(l=20, r=20, t=40, b=20),
-                                  title_font=dict(size=14), showlegend=True,
-                                  legend=dict(orientation="h", yanchor="top", y=1.15, xanchor="left", x=0, title='Format'))
-    fig_format_lines.update_yaxes(title_text=format_axis_label, showgrid=False)
-    fig_format_lines.update_xaxes(title_text='Year', showgrid=False)
-    fig_format_lines.update_traces(hovertemplate='<b>%{fullData.name}</b><br>Year: %{x}<br>Avg Price: $%{y:.2f}<extra></extra>')
-    st.plotly_chart(fig_format_lines, config={'responsive': True}, use_container_width=True)
+    def build_format_lines():
+        format_rows, format_rows_part = by_genre('format_rows', selected_genre)
+        format_lines = format_rows.rows(year_range, format_rows_part)
+        fig_format_lines = px.line(format_lines, x='year', y=format_measure_col, color='book_format',
+                                  title='By Format', markers=True)
+        fig_format_lines.update_layout(height=220, margin=dict(l=20, r=20, t=40, b=20),
+                                      title_font=dict(size=14), showlegend=True,
+                                      legend=dict(orientation="h", yanchor="top", y=1.15, xanchor="left", x=0, title='Format'))
+        fig_format_lines.update_yaxes(title_text=format_axis_label, showgrid=False)
+        fig_format_lines.update_xaxes(title_text='Year', showgrid=False)
+        fig_format_lines.update_traces(hovertemplate='<b>%{fullData.name}</b><br>Year: %{x}<br>Avg Price: $%{y:.2f}<extra></extra>')
+        return fig_format_lines
+    
+    st.plotly_chart(cached_figure('format_prices', 'format_lines', build_format_lines), config={'responsive': True}, use_container_width=True)
 
 # Prepare data for both sections
-filtered_genre = genre_data[filter_by_year(genre_data, year_range)]
+with timer.section('filter/genres') as timed:
+    genre_totals = store['genre'].totals(year_range)
+    timed.note(rows=len(genre_totals))
 cols = get_measure_cols(measure)
-genre_sums = filtered_genre.groupby('genre')[cols['genre_col']].sum().reset_index()
+genre_sums = genre_totals[['genre', cols['genre_col']]]
 top_genres = genre_sums.nlargest(5, cols['genre_col'])['genre'].tolist()
 color_palette = ['#08519c', '#3182bd', '#6baed6', '#9ecae1', '#c6dbef']
 
+# The top-n charts read the top-k lists, which total only the keys they examine;
+# ?cache_stats shows how many that was on the last rebuild
+topk_examined = {}
+def top_entries(name, measure_col, k, genre="All Genres"):
+    topk, part = by_genre(name, genre)
+    with timer.section(f'topk/{name}') as timed:
+        top, examined = topk.top(measure_col, year_range, k, part)
+        timed.note(rows=examined)
+    topk_examined[name] = (examined, len(topk.index.keys))
+    return top
+
 # Top 20 Publishers
 st.subheader(f"Top 20 Publishers by {cols['label']}")
-filtered_publishers = top_publishers_data[filter_by_year(top_publishers_data, year_range)].copy()
-if selected_genre != "All Genres":
-    filtered_publishers = filtered_publishers[filtered_publishers['genre'] == selected_genre]
 publisher_col = 'total_sales' if measure == 'Sales' else 'total_reviews'
 
-# Compute weighted average rating across the selected period for each publisher
-filtered_publishers['weighted_rating'] = filtered_publishers['avg_rating'] * filtered_publishers['total_reviews']
-publisher_agg = filtered_publishers.groupby('publisher_name').agg({
-    publisher_col: 'sum',
-    'weighted_rating': 'sum',
-    'total_reviews': 'sum'
-}).reset_index()
-publisher_agg['avg_rating'] = publisher_agg.apply(lambda r: (r['weighted_rating'] / r['total_reviews']) if r['total_reviews'] > 0 else 0, axis=1)
-
-# Take top 20 by primary measure and preserve order
-publisher_agg = publisher_agg.sort_values(publisher_col, ascending=False).head(20).reset_index(drop=True)
-
-def format_publisher_value(val):
-    if measure == 'Sales':
-        if val < 1000:
-            return f'${val:.0f}'
-        elif val < 1e6:
-            return f'${val/1e3:.1f}K'
-        else:
-            return f'${val/1e6:.1f}M'
-    else:
-        if val < 1000:
-            return f'{val:.0f}'
+def build_publishers_chart():
+    # Weighted average rating across the selected period for each publisher
+    # Top 20 by primary measure, in order
+    publisher_agg = top_entries('top_publishers', publisher_col, 20, selected_genre)
+    publisher_agg = publisher_agg[list(dict.fromkeys(['publisher_name', publisher_col, 'weighted_rating', 'total_reviews']))]
+    publisher_agg['avg_rating'] = publisher_agg.apply(lambda r: (r['weighted_rating'] / r['total_reviews']) if r['total_reviews'] > 0 else 0, axis=1)
+
+    def format_publisher_value(val):
+        if measure == 'Sales':
+            if val < 1000:
+                return f'${val:.0f}'
+            elif val < 1e6:
+                return f'${val/1e3:.1f}K'
+            else:
+                return f'${val/1e6:.1f}M'
         else:
-            return f'{val/1e3:.0f}K'
-
-# Create display names with ranking prefix (no truncation)
-publisher_agg['display_name'] = publisher_agg.apply(lambda row: f"{row.name + 1}. {truncate_text(row['publisher_name'])}", axis=1)
-
-# Create custom two-line labels: Avg. Rating: X.XX \n Total Measure
-text_labels = []
-for idx, row in publisher_agg.iterrows():
-    rating_line = f"Avg. Rating: {row['avg_rating']:.2f}"
-    measure_line = format_publisher_value(row[publisher_col])
-    text_labels.append(f"{rating_line}<br>{measure_line}")
-
-fig_publishers = px.bar(publisher_agg, x='display_name', y=publisher_col,
-                        labels={'display_name': 'Publisher', publisher_col: cols['axis_label']},
-                        color_discrete_sequence=['#3182BD'])
-fig_publishers.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20),
-                            xaxis={'categoryorder': 'total descending'},
-                            xaxis_title='Publisher', yaxis_title=cols['axis_label'])
-fig_publishers.update_xaxes(showgrid=False, tickangle=-45)
-fig_publishers.update_yaxes(showgrid=False)
-fig_publishers.update_traces(text=text_labels, textposition='outside', textfont=dict(size=9),
-                            hovertemplate='<b>%{x}</b><br>' + cols['axis_label'] + ': %{y:,.0f}<extra></extra>')
-st.plotly_chart(fig_publishers, config={'responsive': True}, use_container_width=True)
+            if val < 1000:
+                return f'{val:.0f}'
+            else:
+                return f'{val/1e3:.0f}K'
+
+    # Create display names with ranking prefix (no truncation)
+    publisher_agg['display_name'] = publisher_agg.apply(lambda row: f"{row.name + 1}. {truncate_text(row['publisher_name'])}", axis=1)
+
+    # Create custom two-line labels: Avg. Rating: X.XX \n Total Measure
+    text_labels = []
+    for idx, row in publisher_agg.iterrows():
+        rating_line = f"Avg. Rating: {row['avg_rating']:.2f}"
+        measure_line = format_publisher_value(row[publisher_col])
+        text_labels.append(f"{rating_line}<br>{measure_line}")
+
+    fig_publishers = px.bar(publisher_agg, x='display_name', y=publisher_col,
+                            labels={'display_name': 'Publisher', publisher_col: cols['axis_label']},
+                            color_discrete_sequence=['#3182BD'])
+    fig_publishers.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20),
+                                xaxis={'categoryorder': 'total descending'},
+                                xaxis_title='Publisher', yaxis_title=cols['axis_label'])
+    fig_publishers.update_xaxes(showgrid=False, tickangle=-45)
+    fig_publishers.update_yaxes(showgrid=False)
+    fig_publishers.update_traces(text=text_labels, textposition='outside', textfont=dict(size=9),
+                                hovertemplate='<b>%{x}</b><br>' + cols['axis_label'] + ': %{y:,.0f}<extra></extra>')
+    return fig_publishers
+
+st.plotly_chart(cached_figure('publishers', 'publishers', build_publishers_chart), config={'responsive': True}, use_container_width=True)
 
 # Top 10 Books and Authors
-def create_top_chart(data, group_cols, name_col, title):
-    agg = data.groupby(group_cols)[cols['books_col']].sum().reset_index().nlargest(10, cols['books_col'])
+def create_top_chart(totals, name_col, title):
+    agg = totals.nlargest(10, cols['books_col'])
     agg = agg.reset_index(drop=True)
     agg['short_name'] = agg.apply(lambda row: f"{row.name + 1}. {truncate_text(row[name_col])}", axis=1)
     fig = px.bar(agg, x=cols['books_col'], y='short_name', orientation='h',
@@ -336,21 +430,17 @@ def create_top_chart(data, group_cols, name_col, title):
     return fig
 
 selected_genre = st.session_state.get('selected_genre', "All Genres")
-filtered_books = top_books_data[filter_by_year(top_books_data, year_range)]
-if selected_genre != "All Genres":
-    filtered_books = filtered_books[filtered_books['genre'] == selected_genre]
-
-filtered_authors = top_authors_data[filter_by_year(top_authors_data, year_range)]
-if selected_genre != "All Genres":
-    genre_authors = top_books_data[filter_by_year(top_books_data, year_range) & (top_books_data['genre'] == selected_genre)]['author_name'].unique()
-    filtered_authors = filtered_authors[filtered_authors['author_name'].isin(genre_authors)]
 
 # Top 10 side by side
 col_top_books, col_top_authors = st.columns(2)
 with col_top_books:
-    st.plotly_chart(create_top_chart(filtered_books, ['title', 'author_name'], 'title', 'Top 10 Books'), config={'responsive': True})
+    st.plotly_chart(cached_figure('top_charts', 'top_books', lambda: create_top_chart(
+                        top_entries('top_books', cols['books_col'], 10, selected_genre), 'title', 'Top 10 Books')),
+                    config={'responsive': True})
 with col_top_authors:
-    st.plotly_chart(create_top_chart(filtered_authors, ['author_name'], 'author_name', 'Top 10 Authors'), config={'responsive': True})
+    st.plotly_chart(cached_figure('top_charts', 'top_authors', lambda: create_top_chart(
+                        top_entries('top_authors', cols['books_col'], 10, selected_genre), 'author_name', 'Top 10 Authors')),
+                    config={'responsive': True})
 
 # Genre overview
 st.subheader("Genre Analysis")
@@ -359,105 +449,126 @@ st.subheader("Genre Analysis")
 col_pie, col_stacked = st.columns([0.3, 0.7])
 
 with col_pie:
-    genre_agg = filtered_genre.groupby('genre')[cols['genre_col']].sum().reset_index().nlargest(5, cols['genre_col'])
-    pct = (genre_agg[cols['genre_col']].sum() / filtered_genre[cols['genre_col']].sum()) * 100
-    fig = px.pie(genre_agg, values=cols['genre_col'], names='genre', 
-                 title=f'Top 5 Genres by {cols["label"]}', hole=0.4, color_discrete_sequence=color_palette)
-    def format_pie_value(val):
-        if measure == 'Sales':
-            if val < 1000:
-                return f'${val:.0f}'
-            elif val < 1e6:
-                return f'${val/1e3:.1f}K'
+    def build_pie():
+        genre_agg = genre_sums.nlargest(5, cols['genre_col'])
+        pct = (genre_agg[cols['genre_col']].sum() / genre_sums[cols['genre_col']].sum()) * 100
+        fig = px.pie(genre_agg, values=cols['genre_col'], names='genre', 
+                     title=f'Top 5 Genres by {cols["label"]}', hole=0.4, color_discrete_sequence=color_palette)
+        def format_pie_value(val):
+            if measure == 'Sales':
+                if val < 1000:
+                    return f'${val:.0f}'
+                elif val < 1e6:
+                    return f'${val/1e3:.1f}K'
+                else:
+                    return f'${val/1e6:.1f}M'
             else:
-                return f'${val/1e6:.1f}M'
-        else:
-            if val < 1000:
-                return f'{val:.0f}'
-            else:
-                return f'{val/1e3:.0f}K'
-    fig.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20), title_font=dict(size=25), showlegend=True,
-                      legend=dict(orientation="v", yanchor="top", y=1.0, xanchor="left", x=0, xref = 'container'))
-    fig.add_annotation(text=f"Top 5 Share(%):<br>{pct:.1f}%", x=0.5, y=0.5, showarrow=False, font=dict(size=16, color='white'))
-    fig.update_traces(textposition='auto', textfont=dict(size=11),
-                      hovertemplate='<b>%{label}</b><br>' + cols['label'] + ': %{value:,.0f}<extra></extra>')
-    total_genre_val = genre_agg[cols['genre_col']].sum()
-    for trace in fig.data:
-        trace.text = [f"{format_pie_value(v)}<br>({(v/total_genre_val)*100:.1f}%)" for v in trace.values]
-        trace.textinfo = 'label+text'
-    st.plotly_chart(fig, config={'responsive': True})
+                if val < 1000:
+                    return f'{val:.0f}'
+                else:
+                    return f'{val/1e3:.0f}K'
+        fig.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20), title_font=dict(size=25), showlegend=True,
+                          legend=dict(orientation="v", yanchor="top", y=1.0, xanchor="left", x=0, xref = 'container'))
+        fig.add_annotation(text=f"Top 5 Share(%):<br>{pct:.1f}%", x=0.5, y=0.5, showarrow=False, font=dict(size=16, color='white'))
+        fig.update_traces(textposition='auto', textfont=dict(size=11),
+                          hovertemplate='<b>%{label}</b><br>' + cols['label'] + ': %{value:,.0f}<extra></extra>')
+        total_genre_val = genre_agg[cols['genre_col']].sum()
+        for trace in fig.data:
+            trace.text = [f"{format_pie_value(v)}<br>({(v/total_genre_val)*100:.1f}%)" for v in trace.values]
+            trace.textinfo = 'label+text'
+        return fig
+
+    st.plotly_chart(cached_figure('genre_analysis', 'pie', build_pie), config={'responsive': True})
 
 with col_stacked:
-    genre_year = filtered_genre.groupby(['year', 'genre'])[cols['genre_col']].sum().reset_index()
-    genre_year = genre_year[genre_year['genre'].isin(top_genres)]
-    fig = px.bar(genre_year, x='year', y=cols['genre_col'], color='genre', 
-                 labels={'year': 'Year', cols['genre_col']: cols['axis_label'], 'genre': 'Genre'},
-                 title=f'Top 5 Genres Trends', color_discrete_sequence=color_palette, category_orders={'genre': top_genres})
-    fig.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20), title_font=dict(size=25), showlegend=False)
-    fig.update_xaxes(showgrid=False)
-    fig.update_yaxes(showgrid=False)
-    fig.update_traces(textposition='outside', textfont=dict(size=9),
-                      hovertemplate='<b>%{fullData.name}</b><br>Year: %{x}<br>' + cols['axis_label'] + ': %{y:,.0f}<extra></extra>')
-    def format_stacked_value(val):
-        if measure == 'Sales':
-            if val < 1000:
-                return f'${val:.0f}'
-            elif val < 1e6:
-                return f'${val/1e3:.1f}K'
+    def build_stacked():
+        genre_year = store['genre_rows'].rows(year_range)
+        genre_year = genre_year[genre_year['genre'].isin(top_genres)]
+        fig = px.bar(genre_year, x='year', y=cols['genre_col'], color='genre', 
+                     labels={'year': 'Year', cols['genre_col']: cols['axis_label'], 'genre': 'Genre'},
+                     title=f'Top 5 Genres Trends', color_discrete_sequence=color_palette, category_orders={'genre': top_genres})
+        fig.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20), title_font=dict(size=25), showlegend=False)
+        fig.update_xaxes(showgrid=False)
+        fig.update_yaxes(showgrid=False)
+        fig.update_traces(textposition='outside', textfont=dict(size=9),
+                          hovertemplate='<b>%{fullData.name}</b><br>Year: %{x}<br>' + cols['axis_label'] + ': %{y:,.0f}<extra></extra>')
+        def format_stacked_value(val):
+            if measure == 'Sales':
+                if val < 1000:
+                    return f'${val:.0f}'
+                elif val < 1e6:
+                    return f'${val/1e3:.1f}K'
+                else:
+                    return f'${val/1e6:.1f}M'
             else:
-                return f'${val/1e6:.1f}M'
-        else:
-            if val < 1000:
-                return f'{val:.0f}'
-            else:
-                return f'{val/1e3:.0f}K'
-    for trace in fig.data:
-        trace.text = [format_stacked_value(v) for v in trace.y]
-    st.plotly_chart(fig, config={'responsive': True})
+                if val < 1000:
+                    return f'{val:.0f}'
+                else:
+                    return f'{val/1e3:.0f}K'
+        for trace in fig.data:
+            trace.text = [format_stacked_value(v) for v in trace.y]
+        return fig
+
+    st.plotly_chart(cached_figure('genre_analysis', 'trends', build_stacked), config={'responsive': True})
 
 # Treemap below genre analysis
 col_treemap = st.columns(1)[0]
 
 with col_treemap:
-    genre_treemap = top_books_data[filter_by_year(top_books_data, year_range)].groupby('genre')[cols['books_col']].sum().reset_index().dropna(subset=['genre'])
-    genre_treemap = genre_treemap.sort_values(cols['books_col'], ascending=False)
+    def build_treemap():
+        # Book totals per genre equal the genre rollup (review_count is total_reviews per genre)
+        genre_treemap = genre_totals[['genre', cols['genre_col']]].rename(columns={cols['genre_col']: cols['books_col']})
+        genre_treemap = genre_treemap.sort_values(cols['books_col'], ascending=False)
     
-    # Create color mapping: top 5 get blue palette, rest get light grey
-    genre_colors = {}
-    for i, genre in enumerate(genre_treemap['genre'].values):
-        if i < 5:
-            genre_colors[genre] = color_palette[i]
-        else:
-            genre_colors[genre] = "#a5aebf"  # light grey
-    
-    fig = px.treemap(genre_treemap, path=['genre'], values=cols['books_col'], 
-                     title=f"All Genres by {cols['label']}")
-    def format_treemap_value(val):
-        if measure == 'Sales':
-            if val < 1000:
-                return f'${val:.0f}'
-            elif val < 1e6:
-                return f'${val/1e3:.1f}K'
+        # Create color mapping: top 5 get blue palette, rest get light grey
+        genre_colors = {}
+        for i, genre in enumerate(genre_treemap['genre'].values):
+            if i < 5:
+                genre_colors[genre] = color_palette[i]
             else:
-                return f'${val/1e6:.1f}M'
-        else:
-            if val < 1000:
-                return f'{val:.0f}'
+                genre_colors[genre] = "#a5aebf"  # light grey
+    
+        fig = px.treemap(genre_treemap, path=['genre'], values=cols['books_col'], 
+                         title=f"All Genres by {cols['label']}")
+        def format_treemap_value(val):
+            if measure == 'Sales':
+                if val < 1000:
+                    return f'${val:.0f}'
+                elif val < 1e6:
+                    return f'${val/1e3:.1f}K'
+                else:
+                    return f'${val/1e6:.1f}M'
             else:
-                return f'{val/1e3:.0f}K'
-    fig.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20), title_font=dict(size=25), showlegend=False)
+                if val < 1000:
+                    return f'{val:.0f}'
+                else:
+                    return f'{val/1e3:.0f}K'
+        fig.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20), title_font=dict(size=25), showlegend=False)
     
-    # Apply custom colors to each trace
-    for trace in fig.data:
-        trace.marker.colors = [genre_colors.get(label, '#d3d3d3') for label in trace.labels]
+        # Apply custom colors to each trace
+        for trace in fig.data:
+            trace.marker.colors = [genre_colors.get(label, '#d3d3d3') for label in trace.labels]
     
-    fig.update_traces(textfont=dict(size=12), textinfo='text',
-                      hovertemplate='<b>%{label}</b><br>' + cols['label'] + ': %{value:,.0f}<extra></extra>')
-    for i, trace in enumerate(fig.data):
-        trace.text = [f"<b>{label}</b><br>{format_treemap_value(val)}" for label, val in zip(trace.labels, trace.values)]
-        trace.textposition = 'middle center'
-    st.plotly_chart(fig, config={'responsive': True})
-
+        fig.update_traces(textfont=dict(size=12), textinfo='text',
+                          hovertemplate='<b>%{label}</b><br>' + cols['label'] + ': %{value:,.0f}<extra></extra>')
+        for i, trace in enumerate(fig.data):
+            trace.text = [f"<b>{label}</b><br>{format_treemap_value(val)}" for label, val in zip(trace.labels, trace.values)]
+            trace.textposition = 'middle center'
+        return fig
+
+    st.plotly_chart(cached_figure('genre_analysis', 'treemap', build_treemap), config={'responsive': True})
+
+# Add ?cache_stats to the URL to see how often the figure cache is hit
+if 'cache_stats' in st.query_params:
+    stats = figure_cache().stats()
+    st.caption(f"Figure cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+               f"{stats['entries']}/{stats['max_entries']} entries")
+    for name, (examined, keys) in topk_examined.items():
+        st.caption(f"{name}: examined {examined:,} of {keys:,} keys")
+    for dataset, rows, nbytes in memory_report():
+        st.caption(f"{dataset}: {rows:,} rows, {nbytes / 2**20:,.1f} MiB")
+
+timer.finish()
 
 if st.button("Go to Author Insights Dashboard"):
     st.switch_page("pages/dash2.py")
@@ -1,187 +1,764 @@
-import pandas as pd
 import duckdb
 import os
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import kagglehub
-from kagglehub import KaggleDatasetAdapter
-import pandas as pd
+from wordcloud import STOPWORDS
+import profiling
 
-def query(s):
-    return duckdb.sql(s).df()
+# ===========================================
+# CONFIG
+# ===========================================
+class PipelineConfig:
+    # Options of one pipeline run. `stages` names the stages to bring up to date,
+    # together with everything upstream of them (None runs all). `workers` is how
+    # many stages run at once, `threads` how many threads DuckDB uses (None keeps
+    # its default). `keep_tables` returns the dashboard tables with the result.
+    # Without `download` the raw files already in `outdir` are used as they are.
+    def __init__(self, outdir='./dataset', output_format='csv', stages=None, workers=4, threads=None,
+                 force=False, profile=False, keep_tables=False, download=True):
+        self.outdir = outdir
+        self.output_format = output_format
+        self.stages = stages
+        self.workers = workers
+        self.threads = threads
+        self.force = force
+        self.profile = profile
+        self.keep_tables = keep_tables
+        self.download = download
 
-outdir = './dataset'
-if not os.path.exists(outdir):
-    os.mkdir(outdir)
+        self.metadata_path = os.path.join(outdir, 'metadata.csv')
+        self.reviews_path = os.path.join(outdir, 'reviews.csv')
+        self.clean_reviews_path = os.path.join(outdir, 'books_reviews_clean.csv')
+        self.work_db_path = os.path.join(outdir, 'pipeline.duckdb')
+        self.manifest_path = os.path.join(outdir, 'pipeline_manifest.json')
+        self.version_path = os.path.join(outdir, 'dataset_version.json')
+        self.report_path = os.path.join(outdir, 'profile_report.json')
+        self.raw_dir = os.path.join(outdir, 'raw')
 
-metadata_path = './dataset/metadata.csv'
-reviews_path = './dataset/reviews.csv'
-clean_reviews_path = './dataset/books_reviews_clean.csv'
 
-if not os.path.exists(metadata_path) or not os.path.exists(reviews_path):
-    # Download and save the files locally
-    books_metadata = kagglehub.dataset_load(
-        "hadifariborzi/amazon-books-dataset-20k-books-727k-reviews",
-        "amazon_books_metadata_sample_20k.csv",
-    )
-    
-    books_reviews = kagglehub.dataset_load(
-        "hadifariborzi/amazon-books-dataset-20k-books-727k-reviews",
-        "amazon_books_reviews_sample_20k.csv",
-    )
-    
-    books_metadata.to_csv(metadata_path)
-    books_reviews.to_csv(reviews_path)
+class PipelineResult:
+    # `status` maps each stage that was considered to 'built' or 'skipped'
+    def __init__(self, config, status, tables=None, report=None):
+        self.config = config
+        self.status = status
+        self.version_path = config.version_path
+        self.tables = tables or {}
+        self.report = report
 
-if not os.path.exists(clean_reviews_path):
-    clean_reviews_dir = kagglehub.dataset_download("tobypu/book-reviews-clean")
-    import shutil
-    shutil.copy(os.path.join(clean_reviews_dir, "books_reviews_clean.csv"), clean_reviews_path)
+    @property
+    def built(self):
+        return [name for name, status in self.status.items() if status == 'built']
 
-# Load raw data
-books_metadata = pd.read_csv(metadata_path, index_col=0)
-books_reviews = pd.read_csv(reviews_path, index_col=0)
-books_reviews_clean = pd.read_csv(clean_reviews_path, index_col=0)
 
-processed_metadata = query("""
+# ===========================================
+# SQL
+# ===========================================
+PROCESSED_METADATA_SQL = """
     with p1 as (
-      select 
+      select
         * exclude(publisher_date),
-        case 
-          when try_cast(right(substr(publisher_date, strpos(publisher_date, '(')),4) as integer) is not null 
+        case
+          when try_cast(right(substr(publisher_date, strpos(publisher_date, '(')),4) as integer) is not null
           then split(publisher_date,'(')[-1]
           else null
         end as date_str,
-      from books_metadata 
+      from books_metadata
     )
-    select 
+    select
       *,
       case when length(date_str) > 8 then strptime(date_str, '%B %-d, %Y') else null end as published_date
     from p1
-""")
-
-processed_metadata.to_csv('./dataset/processed_metadata.csv', index=False)
+"""
 
-scorecard_data = query("""
-    select 
+# Build the joined fact once; every aggregate below is a grouping set over it
+FACT_SQL = """
+    select
         year(m.published_date) as year,
-        count(distinct m.parent_asin) as total_books,
-        count(r.asin) as total_reviews,
-        sum(r.rating * m.price) as total_sales
+        m.parent_asin,
+        m.title,
+        m.author_name,
+        m.category_level_3_detail as genre,
+        m.publisher as publisher_name,
+        coalesce(m.format, 'Kindle') as book_format,
+        m.price,
+        m.price_numeric,
+        m.page_count,
+        r.asin,
+        r.rating
     from processed_metadata m
     left join books_reviews r using(parent_asin)
     where m.published_date is not null
-    group by year(m.published_date)
-    order by year
-""")
+"""
 
-scorecard_data.to_csv('./dataset/scorecard_data.csv', index=False)
+# Every grouping set is keyed by year plus the listed dimensions.
+# grouping() sets one bit per rolled-up dimension, first dimension highest.
+rollup_dims = ['title', 'author_name', 'genre', 'publisher_name', 'book_format']
+rollup_sets = {
+    'year': [],
+    'genre': ['genre'],
+    'book': ['title', 'author_name', 'genre'],
+    'author': ['author_name'],
+    'author_genre': ['author_name', 'genre'],
+    'format': ['book_format', 'genre'],
+    'publisher': ['publisher_name', 'genre'],
+}
 
-genre_data = query("""
-    select 
-        year(m.published_date) as year,
-        m.category_level_3_detail as genre,
-        count(distinct m.parent_asin) as book_count,
-        count(r.asin) as review_count,
-        sum(r.rating * m.price) as total_sales
-    from processed_metadata m
-    left join books_reviews r using(parent_asin)
-    where m.published_date is not null and m.category_level_3_detail is not null
-    group by year(m.published_date), m.category_level_3_detail
+def grouping_id(name):
+    dims = rollup_sets[name]
+    return sum(1 << (len(rollup_dims) - 1 - i) for i, d in enumerate(rollup_dims) if d not in dims)
+
+grouping_sets = ", ".join("(" + ", ".join(['year'] + dims) + ")" for dims in rollup_sets.values())
+
+# Single grouped pass over the fact. The price-filtered aggregates feed format_data.
+# Sales use compensated sums, which do not depend on the order the parallel
+# aggregation adds rows in, so the cents shown on the dashboards are stable.
+ROLLUP_SQL = f"""
+    select
+        grouping({', '.join(rollup_dims)}) as gid,
+        year,
+        {', '.join(rollup_dims)},
+        count(distinct parent_asin) as book_count,
+        count(asin) as total_reviews,
+        fsum(rating * price) as total_sales,
+        avg(rating) as avg_rating,
+        count(*) filter (where price_numeric is not null) as priced_rows,
+        count(distinct parent_asin) filter (where price_numeric is not null) as priced_book_count,
+        count(asin) filter (where price_numeric is not null) as priced_reviews,
+        fsum(rating * price_numeric) as priced_sales,
+        avg(price_numeric) as avg_price,
+        avg(page_count) filter (where price_numeric is not null) as avg_page_count
+    from fact
+    group by grouping sets ({grouping_sets})
+"""
+
+SCORECARD_SQL = f"""
+    select year, book_count as total_books, total_reviews, total_sales
+    from rollup
+    where gid = {grouping_id('year')}
+    order by year
+"""
+
+GENRE_SQL = f"""
+    select year, genre, book_count, total_reviews as review_count, total_sales
+    from rollup
+    where gid = {grouping_id('genre')} and genre is not null
     order by year, book_count desc
-""")
+"""
 
-genre_data.to_csv('./dataset/genre_data.csv', index=False)
+TOP_BOOKS_SQL = f"""
+    select year, title, author_name, genre, total_reviews, total_sales
+    from rollup
+    where gid = {grouping_id('book')}
+    order by year, total_sales desc
+"""
 
-top_books_data = query("""
-    select 
-        year(m.published_date) as year,
-        m.title,
-        m.author_name,
-        m.category_level_3_detail as genre,
-        count(r.asin) as total_reviews,
-        sum(r.rating * m.price) as total_sales
-    from processed_metadata m
-    left join books_reviews r using(parent_asin)
-    where m.published_date is not null
-    group by year(m.published_date), m.title, m.author_name, m.category_level_3_detail
+TOP_AUTHORS_SQL = f"""
+    select year, author_name, total_reviews, total_sales
+    from rollup
+    where gid = {grouping_id('author')} and author_name is not null
     order by year, total_sales desc
-""")
+"""
 
-top_books_data.to_csv('./dataset/top_books_data.csv', index=False)
+AUTHOR_GENRES_SQL = f"""
+    select year, author_name, genre, total_reviews, total_sales
+    from rollup
+    where gid = {grouping_id('author_genre')} and author_name is not null and genre is not null
+    order by year, genre, total_sales desc
+"""
 
-top_authors_data = query("""
-    select 
-        year(m.published_date) as year,
-        m.author_name,
-        count(r.asin) as total_reviews,
-        sum(r.rating * m.price) as total_sales
-    from processed_metadata m
-    left join books_reviews r using(parent_asin)
-    where m.published_date is not null and m.author_name is not null
-    group by year(m.published_date), m.author_name
+# Per-format rows first, then the 'All Formats' yearly rows
+FORMAT_SQL = f"""
+    select
+        year,
+        case when gid = {grouping_id('year')} then 'All Formats' else book_format end as book_format,
+        genre,
+        avg_price,
+        avg_page_count,
+        priced_book_count as book_count,
+        priced_reviews as total_reviews,
+        priced_sales as total_sales
+    from rollup
+    where priced_rows > 0
+      and (gid = {grouping_id('year')} or (gid = {grouping_id('format')} and genre is not null))
+    order by gid = {grouping_id('year')}, year, book_format
+"""
+
+TOP_PUBLISHERS_SQL = f"""
+    select year, publisher_name, genre, book_count, total_reviews, total_sales, avg_rating
+    from rollup
+    where gid = {grouping_id('publisher')} and publisher_name is not null and genre is not null
     order by year, total_sales desc
-""")
+"""
 
-top_authors_data.to_csv('./dataset/top_authors_data.csv', index=False)
+# Per-year rankings of books, authors and publishers, over all genres (genre is
+# null) and within each genre. The dashboards merge them to find the top entries
+# of a year range without summing the long tail.
+RANKINGS_SQL = """
+    with lists as (
+        select 'book' as kind, null::varchar as genre, year, title, author_name, null::varchar as publisher_name,
+               sum(total_reviews) as total_reviews, sum(total_sales) as total_sales
+        from top_books_data
+        where title is not null and author_name is not null
+        group by year, title, author_name
+        union all
+        select 'book', genre, year, title, author_name, null, total_reviews, total_sales
+        from top_books_data
+        where title is not null and author_name is not null and genre is not null
+        union all
+        select 'author', null, year, null, author_name, null, total_reviews, total_sales
+        from top_authors_data
+        union all
+        select 'author', genre, year, null, author_name, null, total_reviews, total_sales
+        from author_genre_data
+        union all
+        select 'publisher', null, year, null, null, publisher_name, sum(total_reviews), sum(total_sales)
+        from top_publishers_data
+        group by year, publisher_name
+        union all
+        select 'publisher', genre, year, null, null, publisher_name, total_reviews, total_sales
+        from top_publishers_data
+    )
+    select
+        *,
+        row_number() over (partition by kind, genre, year order by total_sales desc nulls last) as sales_rank,
+        row_number() over (partition by kind, genre, year order by total_reviews desc nulls last) as reviews_rank
+    from lists
+    order by kind, genre nulls first, year, sales_rank
+"""
 
-format_data = query("""
-    select 
-        year(m.published_date) as year,
-        coalesce(m.format, 'Kindle') as book_format,
-        m.category_level_3_detail as genre,
-        avg(m.price_numeric) as avg_price,
-        avg(m.page_count) as avg_page_count,
-        count(distinct m.parent_asin) as book_count,
-        count(r.asin) as total_reviews,
-        sum(r.rating * m.price_numeric) as total_sales
-    from processed_metadata m
-    left join books_reviews r using(parent_asin)
-    where m.published_date is not null and m.price_numeric is not null and m.category_level_3_detail is not null
-    group by year(m.published_date), coalesce(m.format, 'Kindle'), m.category_level_3_detail
-    order by year, book_format
-""")
+# Cleaned reviews with a typed date, served to the author insights page
+REVIEWS_SQL = """
+    select * replace (try_cast(date as timestamp) as date)
+    from books_reviews_clean
+"""
 
-all_formats = query("""
-    select 
-        year(m.published_date) as year,
-        'All Formats' as book_format,
-        avg(m.price_numeric) as avg_price,
-        avg(m.page_count) as avg_page_count,
-        count(distinct m.parent_asin) as book_count,
-        count(r.asin) as total_reviews,
-        sum(r.rating * m.price_numeric) as total_sales
-    from processed_metadata m
-    left join books_reviews r using(parent_asin)
-    where m.published_date is not null and m.price_numeric is not null
-    group by year(m.published_date)
-    order by year
-""")
+# Row order of tables in the serving store. The dashboards index the reviews and
+# the sentiment cube by position and find date ranges by binary search; rowid
+# keeps ties in load order, and the cube's keys are unique.
+SERVING_ORDER = {
+    'reviews': 'date nulls last, rowid',
+    'sentiment_cube': 'date nulls last, author_name nulls last, category nulls last, sentiment_rating nulls last',
+}
 
-format_data = pd.concat([format_data, all_formats], ignore_index=True)
-format_data.to_csv('./dataset/format_data.csv', index=False)
 
-top_publishers_data = query("""
-    select 
-        year(m.published_date) as year,
-        m.publisher as publisher_name,
-        m.category_level_3_detail as genre,
-        count(distinct m.parent_asin) as book_count,
-        count(r.asin) as total_reviews,
-        sum(r.rating * m.price) as total_sales,
-        avg(r.rating) as avg_rating
-    from processed_metadata m
-    left join books_reviews r using(parent_asin)
-    where m.published_date is not null and m.publisher is not null and m.category_level_3_detail is not null
-    group by year(m.published_date), m.publisher, m.category_level_3_detail
-    order by year, total_sales desc
-""")
-
-top_publishers_data.to_csv('./dataset/top_publishers_data.csv', index=False)
-
-print("Data processing complete!")
-print(f"Processed metadata: {len(processed_metadata)} rows")
-print(f"Scorecard data saved")
-print(f"Genre data saved")
-print(f"Top books data saved")
-print(f"Top authors data saved")
-print(f"Top publishers data saved")
-print(scorecard_data)
\ No newline at end of file
+def sql_list(words):
+    return "[" + ", ".join("'" + w.replace("'", "''") + "'" for w in sorted(words)) + "]"
+
+
+# Word cloud terms. Every review's clean_text is tokenized once the way
+# WordCloud.process_text does it: runs of word characters and apostrophes, "'s"
+# dropped, numbers and stopwords skipped. `review` is the row's position in the
+# serving store, so the dashboard sums the counts of the rows it selected.
+REVIEW_WORDS_SQL = f"""
+    with numbered as (
+        select (row_number() over (order by {SERVING_ORDER['reviews']}) - 1)::integer as review, clean_text
+        from reviews
+    ), tokens as (
+        select review, unnest(regexp_extract_all(clean_text, '[\\pL\\pN_][\\pL\\pN_'']*')) as word
+        from numbered
+    ), words as (
+        select review, case when lower(word) like '%''s' then left(word, length(word) - 2) else word end as word
+        from tokens
+    )
+    select review, lower(word) as word, count(*)::integer as n
+    from words
+    where not regexp_full_match(word, '[0-9]+') and lower(word) not in (select unnest({sql_list(STOPWORDS)}))
+    group by all
+    order by review, word
+"""
+
+# Words of author names never make it into a cloud; nor do these
+EXTRA_BANNED_WORDS = ['book', 'one']
+
+# The vocabulary, with the terms to leave out and, for a plural, the term of its
+# singular: WordCloud counts "words" as "word" when both occur
+TERMS_SQL = f"""
+    with vocabulary as (
+        select row_number() over (order by word)::integer - 1 as term, word
+        from (select distinct word from review_words)
+    ), banned as (
+        select distinct unnest(regexp_split_to_array(lower(author_name), '\\s+')) as word
+        from reviews where author_name is not null
+        union
+        select unnest({sql_list(EXTRA_BANNED_WORDS)})
+    )
+    select v.term, v.word, v.word in (select word from banned) as banned, s.term as singular
+    from vocabulary v
+    left join vocabulary s on v.word like '%s' and v.word not like '%ss' and s.word = left(v.word, length(v.word) - 1)
+    order by v.term
+"""
+
+REVIEW_TERMS_SQL = """
+    select r.review, t.term, r.n
+    from review_words r join terms t using (word)
+    order by r.review, t.term
+"""
+
+# Review counts by author, category, day and sentiment, laid out by day like the
+# reviews. The sentiment pie and trend of any selection are sums over its rows.
+SENTIMENT_CUBE_SQL = """
+    select author_name, category_level_3_detail as category, date_trunc('day', date) as date, sentiment_rating,
+           count(*)::integer as reviews
+    from reviews
+    group by all
+    order by date nulls last, author_name nulls last, category nulls last, sentiment_rating nulls last
+"""
+
+# Explicit column types for the raw files; ids stay text so leading zeros survive
+METADATA_TYPES = {
+    'title': 'VARCHAR', 'subtitle': 'VARCHAR', 'author_name': 'VARCHAR', 'author_about': 'VARCHAR',
+    'publisher': 'VARCHAR', 'publisher_date': 'VARCHAR', 'format': 'VARCHAR', 'page_count': 'DOUBLE',
+    'language': 'VARCHAR', 'isbn_10': 'VARCHAR', 'isbn_13': 'VARCHAR', 'main_category': 'VARCHAR',
+    'category_level_1_main': 'VARCHAR', 'category_level_2_sub': 'VARCHAR', 'category_level_3_detail': 'VARCHAR',
+    'average_rating': 'DOUBLE', 'rating_number': 'DOUBLE', 'price': 'DOUBLE', 'price_numeric': 'DOUBLE',
+    'description': 'VARCHAR', 'features_text': 'VARCHAR', 'dimensions': 'VARCHAR', 'item_weight': 'VARCHAR',
+    'images': 'VARCHAR', 'videos': 'VARCHAR', 'store': 'VARCHAR', 'parent_asin': 'VARCHAR', 'bought_together': 'VARCHAR',
+}
+
+REVIEWS_TYPES = {
+    'rating': 'DOUBLE', 'title': 'VARCHAR', 'text': 'VARCHAR', 'images': 'VARCHAR', 'asin': 'VARCHAR',
+    'parent_asin': 'VARCHAR', 'user_id': 'VARCHAR', 'timestamp': 'BIGINT', 'helpful_vote': 'BIGINT',
+    'verified_purchase': 'BOOLEAN', 'date': 'TIMESTAMP', 'year': 'BIGINT',
+}
+
+# Only the columns the dashboards rely on are typed; the rest are kept as text.
+# The date is cast leniently in REVIEWS_SQL.
+CLEAN_REVIEWS_TYPES = {
+    'author_name': 'VARCHAR', 'category_level_3_detail': 'VARCHAR', 'date': 'VARCHAR',
+    'sentiment_rating': 'BIGINT', 'helpful_vote': 'BIGINT', 'text': 'VARCHAR', 'clean_text': 'VARCHAR',
+}
+
+OUTPUT_TABLES = ['scorecard_data', 'genre_data', 'top_books_data', 'top_authors_data', 'author_genre_data', 'format_data',
+                 'top_publishers_data', 'rankings']
+# Everything the serving store holds
+SERVING_TABLES = OUTPUT_TABLES + ['reviews', 'terms', 'review_terms', 'sentiment_cube']
+
+
+# ===========================================
+# STAGES
+# ===========================================
+class Stage:
+    # A named step of the pipeline. `inputs` are upstream stages, `files` are raw
+    # input files; `tables`, `views` and `outputs` are what the stage leaves behind
+    # in the working database and on disk, `exports` the tables it writes out to
+    # `outputs`. The definition (SQL or source) is fingerprinted.
+    def __init__(self, name, run, inputs=(), files=(), tables=(), views=(), outputs=(), exports=(), sql=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.files = list(files)
+        self.tables = list(tables)
+        self.views = list(views)
+        self.outputs = list(outputs)
+        self.exports = list(exports)
+        self.definition = sql if sql is not None else inspect.getsource(run)
+
+
+def output_path(outdir, name, output_format):
+    return os.path.join(outdir, f'{name}.{output_format}')
+
+
+def write_output(con, table, path, output_format):
+    # Parquet keeps column types and dictionary-encodes repeated strings
+    if output_format == 'parquet':
+        con.execute(f"copy {table} to '{path}' (format parquet, compression zstd)")
+    else:
+        con.table(table).df().to_csv(path, index=False)
+
+
+def copy_if_changed(src, dst):
+    # copy2 keeps the upstream mtime, so an unchanged file is left alone and its
+    # cached hash stays valid
+    if os.path.exists(dst):
+        src_stat, dst_stat = os.stat(src), os.stat(dst)
+        if src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+            return
+    shutil.copy2(src, dst)
+
+
+def download_books(con, metadata_path, reviews_path):
+    books_dir = kagglehub.dataset_download("hadifariborzi/amazon-books-dataset-20k-books-727k-reviews")
+    copy_if_changed(os.path.join(books_dir, "amazon_books_metadata_sample_20k.csv"), metadata_path)
+    copy_if_changed(os.path.join(books_dir, "amazon_books_reviews_sample_20k.csv"), reviews_path)
+
+
+def download_clean_reviews(con, clean_reviews_path):
+    clean_reviews_dir = kagglehub.dataset_download("tobypu/book-reviews-clean")
+    copy_if_changed(os.path.join(clean_reviews_dir, "books_reviews_clean.csv"), clean_reviews_path)
+
+
+def cache_raw(con, name, csv_path, parquet_path, types, all_varchar=False):
+    # The CSV is parsed once, with DuckDB's multithreaded reader, into typed zstd
+    # Parquet; `name` is a view that scans that file in place. Copies written by
+    # older versions of the pipeline carry an unnamed index column, which is dropped.
+    type_map = ", ".join(f"'{col}': '{col_type}'" for col, col_type in types.items())
+    tmp_path = parquet_path + '.tmp'
+    con.execute(f"""
+        copy (
+            select columns(c -> not regexp_matches(c, '^(column[0-9]+|Unnamed: 0)$'))
+            from read_csv('{csv_path}', header = true, types = {{{type_map}}}, all_varchar = {all_varchar})
+        ) to '{tmp_path}' (format parquet, compression zstd)
+    """)
+    os.replace(tmp_path, parquet_path)
+    # Working databases from older versions hold the raw data as a table
+    if con.execute("select count(*) from duckdb_tables() where table_name = ?", [name]).fetchone()[0]:
+        con.execute(f"drop table {name}")
+    con.execute(f"create or replace view {name} as select * from read_parquet('{parquet_path}')")
+
+
+def build_serving_store(con, outdir, version_path):
+    # Every run publishes a new generation: a store file named after a hash of its
+    # contents plus the version manifest naming it. The store is written under a
+    # temporary name and the manifest is swapped in last with a rename, so the
+    # dashboards see either the old generation or the new one, never a mix, and a
+    # file they have open is never rewritten.
+    tables = SERVING_TABLES
+    hashes = {name: table_hash(con, name) for name in tables}
+    layout = {'tables': hashes, 'order': SERVING_ORDER}
+    version = hashlib.sha256(json.dumps(layout, sort_keys=True).encode()).hexdigest()[:16]
+    store = f'books-{version}.duckdb'
+    store_path = os.path.join(outdir, store)
+
+    tmp_store_path = store_path + '.tmp'
+    if os.path.exists(tmp_store_path):
+        os.remove(tmp_store_path)
+    con.execute(f"attach '{tmp_store_path}' as store")
+    for name in tables:
+        order = f" order by {SERVING_ORDER[name]}" if name in SERVING_ORDER else ""
+        con.execute(f"create table store.{name} as select * from {name}{order}")
+    con.execute("detach store")
+    os.replace(tmp_store_path, store_path)
+
+    previous = None
+    if os.path.exists(version_path):
+        with open(version_path) as f:
+            previous = json.load(f).get('store')
+    manifest = {'version': version, 'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'store': store,
+                'tables': {name: {'content_hash': h} for name, h in hashes.items()}}
+    tmp_path = version_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, version_path)
+
+    # The previous generation stays for sessions still finishing a rerun on it
+    for name in os.listdir(outdir):
+        if name.startswith('books-') and name.endswith('.duckdb') and name not in (store, previous):
+            os.remove(os.path.join(outdir, name))
+    # Stores from before versioning
+    legacy_path = os.path.join(outdir, 'books.duckdb')
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    return version
+
+
+def build_stages(config):
+    stages = {}
+    output_format = config.output_format
+
+    def add(name, run, **kwargs):
+        stages[name] = Stage(name, run, **kwargs)
+
+    def add_table(name, sql, inputs, output=None):
+        # Materializes `sql` as table `name`; with `output` a separate stage writes it
+        # out, so the write runs alongside whatever is computed next
+        add(name, lambda con: con.execute(f"create or replace table {name} as {sql}"),
+            inputs=inputs, tables=[name], sql=sql)
+        if output:
+            path = output_path(config.outdir, output, output_format)
+            add(f'write_{output}', lambda con: write_output(con, name, path, output_format),
+                inputs=[name], outputs=[path], exports=[name], sql=f"{inspect.getsource(write_output)}\n-- {name} -> {path}")
+
+    def add_raw(name, path, source, types, all_varchar=False):
+        parquet_path = os.path.join(config.raw_dir, f'{name}.parquet')
+        add(name, lambda con: cache_raw(con, name, path, parquet_path, types, all_varchar), inputs=[source], files=[path],
+            views=[name], outputs=[parquet_path],
+            sql=f"{inspect.getsource(cache_raw)}\n-- {name} <- {path} {types} all_varchar={all_varchar}")
+
+    add('download_books', lambda con: download_books(con, config.metadata_path, config.reviews_path),
+        outputs=[config.metadata_path, config.reviews_path], sql=inspect.getsource(download_books))
+    add('download_clean_reviews', lambda con: download_clean_reviews(con, config.clean_reviews_path),
+        outputs=[config.clean_reviews_path], sql=inspect.getsource(download_clean_reviews))
+
+    add_raw('books_metadata', config.metadata_path, 'download_books', METADATA_TYPES)
+    add_raw('books_reviews', config.reviews_path, 'download_books', REVIEWS_TYPES)
+    add_raw('books_reviews_clean', config.clean_reviews_path, 'download_clean_reviews', CLEAN_REVIEWS_TYPES, all_varchar=True)
+
+    add_table('processed_metadata', PROCESSED_METADATA_SQL, ['books_metadata'], output='processed_metadata')
+    add_table('fact', FACT_SQL, ['processed_metadata', 'books_reviews'])
+    add_table('rollup', ROLLUP_SQL, ['fact'])
+    add_table('scorecard_data', SCORECARD_SQL, ['rollup'], output='scorecard_data')
+    add_table('genre_data', GENRE_SQL, ['rollup'], output='genre_data')
+    add_table('top_books_data', TOP_BOOKS_SQL, ['rollup'], output='top_books_data')
+    add_table('top_authors_data', TOP_AUTHORS_SQL, ['rollup'], output='top_authors_data')
+    add_table('author_genre_data', AUTHOR_GENRES_SQL, ['rollup'], output='author_genre_data')
+    add_table('format_data', FORMAT_SQL, ['rollup'], output='format_data')
+    add_table('top_publishers_data', TOP_PUBLISHERS_SQL, ['rollup'], output='top_publishers_data')
+    add_table('rankings', RANKINGS_SQL, ['top_books_data', 'top_authors_data', 'author_genre_data', 'top_publishers_data'],
+              output='rankings')
+    # The raw cleaned reviews are already CSV; Parquet mode adds a typed copy
+    add_table('reviews', REVIEWS_SQL, ['books_reviews_clean'],
+              output='books_reviews_clean' if output_format == 'parquet' else None)
+    add_table('review_words', REVIEW_WORDS_SQL, ['reviews'])
+    add_table('terms', TERMS_SQL, ['review_words', 'reviews'])
+    add_table('review_terms', REVIEW_TERMS_SQL, ['review_words', 'terms'])
+    add_table('sentiment_cube', SENTIMENT_CUBE_SQL, ['reviews'])
+
+    add('serving_store', lambda con: build_serving_store(con, config.outdir, config.version_path),
+        inputs=SERVING_TABLES, outputs=[config.version_path], exports=SERVING_TABLES,
+        sql=f"{inspect.getsource(build_serving_store)}\n-- order {SERVING_ORDER}")
+    return stages
+
+
+def select_stages(stages, targets):
+    # The named stages plus everything upstream of them, in definition order
+    if targets is None:
+        return stages
+    unknown = [name for name in targets if name not in stages]
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {', '.join(unknown)}; available: {', '.join(stages)}")
+    needed = set()
+
+    def visit(name):
+        if name not in needed:
+            needed.add(name)
+            for dep in stages[name].inputs:
+                visit(dep)
+
+    for name in targets:
+        visit(name)
+    return {name: stage for name, stage in stages.items() if name in needed}
+
+
+# ===========================================
+# MANIFEST + FINGERPRINTS
+# ===========================================
+# Stages finish on worker threads, which record file hashes in the shared manifest
+manifest_lock = threading.Lock()
+
+
+def load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    return {'files': {}, 'stages': {}}
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + '.tmp'
+    with manifest_lock, open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def file_hash(path, manifest):
+    # Content hash, reused while the file's size and mtime are unchanged
+    stat = os.stat(path)
+    with manifest_lock:
+        cached = manifest['files'].get(path)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    with manifest_lock:
+        manifest['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+
+def table_hash(con, table):
+    # Digest of the table contents and row order
+    n, h = con.execute(f"select count(*), sum(hash(rowid, {table})) from {table}").fetchone()
+    return f"{n}:{h}"
+
+
+def stage_fingerprint(stage, digests, manifest):
+    payload = {
+        'definition': stage.definition,
+        'files': {path: file_hash(path, manifest) for path in stage.files},
+        'inputs': {name: digests[name] for name in stage.inputs},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def stage_digest(stage, con, manifest):
+    # What downstream stages see of this one: its tables, or else its files
+    # (a view over a Parquet file is covered by the file's hash)
+    if stage.tables:
+        parts = [table_hash(con, t) for t in stage.tables]
+    elif not stage.inputs and not stage.files:
+        # Source stages: their readers hash the files they read, so a change to
+        # one download only rebuilds the readers of that file
+        parts = []
+    else:
+        parts = [file_hash(p, manifest) for p in stage.outputs]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def is_fresh(stage, entry, fingerprint, con, force=False, download=True):
+    existing = {r[0] for r in con.execute("select table_name from duckdb_tables() union all select view_name from duckdb_views()").fetchall()}
+    if not all(os.path.exists(p) for p in stage.outputs) or not set(stage.tables + stage.views) <= existing:
+        return False
+    # Source stages (downloads) run every time. kagglehub keeps its own cache and
+    # the copies are only replaced when upstream changed; the content hashes of
+    # the copies then decide whether anything downstream is stale.
+    if not stage.inputs and not stage.files:
+        return not download
+    return not force and entry is not None and entry['fingerprint'] == fingerprint
+
+
+def topological_order(stages):
+    order, seen = [], set()
+
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        for dep in stages[name].inputs:
+            visit(dep)
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+def build_stage(stage, con, manifest, profiler=None):
+    # Each worker gets its own cursor; DuckDB runs the queries of different cursors concurrently
+    cur = con.cursor()
+    try:
+        if profiler:
+            profiler.run(stage, cur)
+        else:
+            stage.run(cur)
+        return stage_digest(stage, cur, manifest)
+    finally:
+        cur.close()
+
+
+def run_stages(stages, con, manifest_path, force=False, workers=4, profiler=None, download=True):
+    # A stage is scheduled as soon as all of its inputs are done, so independent
+    # branches (the downloads, the CSV loads, the summary tables and their writes)
+    # run side by side on the worker pool
+    manifest = load_manifest(manifest_path)
+    digests, status = {}, {}
+    pending = topological_order(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            ready = [name for name in pending if all(dep in digests for dep in stages[name].inputs)]
+            for name in ready:
+                pending.remove(name)
+                stage = stages[name]
+                fingerprint = stage_fingerprint(stage, digests, manifest)
+                entry = manifest['stages'].get(name)
+                if is_fresh(stage, entry, fingerprint, con, force, download):
+                    digests[name] = entry['digest'] if entry else stage_digest(stage, con, manifest)
+                    manifest['stages'][name] = {'fingerprint': fingerprint, 'digest': digests[name]}
+                    status[name] = 'skipped'
+                    print(f"[skip]  {name}")
+                    if profiler:
+                        profiler.skip(stage)
+                else:
+                    running[pool.submit(build_stage, stage, con, manifest, profiler)] = (name, fingerprint)
+            if any(all(dep in digests for dep in stages[name].inputs) for name in pending):
+                # Skipped stages may have unblocked others
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint = running.pop(future)
+                digests[name] = future.result()
+                manifest['stages'][name] = {'fingerprint': fingerprint, 'digest': digests[name]}
+                status[name] = 'built'
+                print(f"[built] {name}")
+            save_manifest(manifest, manifest_path)
+    save_manifest(manifest, manifest_path)
+    return status
+
+
+def run_pipeline(config=None):
+    # Brings the selected stages up to date and returns what was done. Safe to
+    # call from other programs; nothing here depends on the command line.
+    config = config or PipelineConfig()
+    os.makedirs(config.raw_dir, exist_ok=True)
+    stages = select_stages(build_stages(config), config.stages)
+
+    con = duckdb.connect(config.work_db_path)
+    try:
+        if config.threads:
+            con.execute(f"set threads = {int(config.threads)}")
+        report = None
+        if config.profile:
+            # Stages run serially so that CPU time and peak memory belong to one stage
+            profiler = profiling.Profiler(stages)
+            status = run_stages(stages, con, config.manifest_path, force=True, workers=1, profiler=profiler,
+                                download=config.download)
+            report = profiler.report(format=config.output_format, threads=config.threads)
+            report['comparison'] = profiling.compare(profiling.load_report(config.report_path), report)
+            profiling.save_report(report, config.report_path)
+        else:
+            status = run_stages(stages, con, config.manifest_path, force=config.force, workers=config.workers,
+                                download=config.download)
+
+        tables = {}
+        if config.keep_tables:
+            existing = {r[0] for r in con.execute("select table_name from duckdb_tables()").fetchall()}
+            tables = {name: con.table(name).df() for name in OUTPUT_TABLES if name in existing}
+    finally:
+        con.close()
+    return PipelineResult(config, status, tables, report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dashboard datasets")
+    parser.add_argument("--outdir", default="./dataset",
+                        help="directory for the raw files, the derived datasets and the serving store")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="file format of the derived datasets")
+    parser.add_argument("--stages", nargs="+", metavar="STAGE",
+                        help="only bring these stages (and the ones they depend on) up to date")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every stage even if its inputs are unchanged (downloads are kept)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of stages run at the same time")
+    parser.add_argument("--threads", type=int,
+                        help="number of threads DuckDB uses per query (default: all cores)")
+    parser.add_argument("--profile", action="store_true",
+                        help="rebuild every stage one at a time and write a profiling report to OUTDIR/profile_report.json")
+    parser.add_argument("--no-download", dest="download", action="store_false",
+                        help="use the raw CSVs already in OUTDIR without checking Kaggle for a newer version")
+    args = parser.parse_args()
+
+    config = PipelineConfig(outdir=args.outdir, output_format=args.format, stages=args.stages, workers=args.workers,
+                            threads=args.threads, force=args.force, profile=args.profile, download=args.download)
+    try:
+        result = run_pipeline(config)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print("Data processing complete!")
+    con = duckdb.connect(config.work_db_path, read_only=True)
+    tables = {r[0] for r in con.execute("select table_name from duckdb_tables()").fetchall()}
+    if 'processed_metadata' in tables:
+        print(f"Processed metadata: {con.execute('select count(*) from processed_metadata').fetchone()[0]} rows")
+    if 'serving_store' in result.status:
+        with open(config.version_path) as f:
+            published = json.load(f)
+        print(f"Serving store {published['store']} published as version {published['version']}")
+    if 'scorecard_data' in tables:
+        print(con.table('scorecard_data').df())
+    con.close()
+    if result.report:
+        profiling.print_report(result.report, config.report_path)
+
+
+if __name__ == "__main__":
+    main()
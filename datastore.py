@@ -0,0 +1,187 @@
+import os
+import json
+import queue
+import threading
+from contextlib import contextmanager
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import streamlit as st
+
+DATASET_DIR = './dataset'
+VERSION_PATH = os.path.join(DATASET_DIR, 'dataset_version.json')
+
+
+class ConnectionPool:
+    # DuckDB cursors are not thread safe, so every query borrows its own cursor
+    # on the shared read-only database handle and returns it afterwards
+    def __init__(self, path, size=8):
+        self._con = duckdb.connect(path, read_only=True)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def cursor(self):
+        with self._slots:
+            try:
+                cur = self._idle.get_nowait()
+            except queue.Empty:
+                cur = self._con.cursor()
+            try:
+                yield cur
+            finally:
+                self._idle.put(cur)
+
+    def query(self, sql, params=None):
+        with self.cursor() as cur:
+            return cur.execute(sql, params or {}).df()
+
+
+@st.cache_resource(max_entries=2)
+def _open_pool(store_version: str):
+    # A generation's store file is never rewritten, so the pool of a version
+    # always reads that version's data, whatever the pipeline publishes meanwhile
+    return ConnectionPool(os.path.join(DATASET_DIR, f'books-{store_version}.duckdb'))
+
+
+# The manifest the pipeline publishes with every run; re-read only when the file
+# is swapped, so checking for a new version costs one stat per rerun
+_manifest = {'stat': None, 'data': None}
+_manifest_lock = threading.Lock()
+
+
+def dataset_manifest():
+    try:
+        stat = os.stat(VERSION_PATH)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"{VERSION_PATH} not found, run dataprocessing.py first") from None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _manifest_lock:
+        if _manifest['stat'] != key:
+            with open(VERSION_PATH) as f:
+                _manifest['data'] = json.load(f)
+            _manifest['stat'] = key
+        return _manifest['data']
+
+
+def store_version():
+    # Every dashboard cache is keyed on this, so a new pipeline run invalidates them all at once
+    return dataset_manifest()['version']
+
+
+# Functions taking `version` read that store generation, or the current one if
+# it is None. Anything cached on a version must pass it, so that an entry is
+# never built from a newer generation published while it was being loaded.
+def query(sql, params=None, version=None):
+    # A new version opens a new pool; the previous one is kept for reruns still using it
+    return _open_pool(version or store_version()).query(sql, params)
+
+
+# Tables handed over by a pipeline run in this process (see main.py), valid
+# only for the store version that run produced
+_handed_over = {}
+
+
+def hand_over(tables):
+    _handed_over.clear()
+    _handed_over[store_version()] = tables
+
+
+def load_table(name, columns, version=None):
+    # Handed-over frames are shared, so callers must not modify what they get back
+    version = version or store_version()
+    tables = _handed_over.get(version, {})
+    if name in tables:
+        return tables[name][columns]
+    return query(f"select {', '.join(columns)} from {name}", version=version)
+
+
+class SharedTables:
+    # Read-only Arrow tables of one store version, loaded once and shared by every
+    # session of the process. Sessions filter, slice and take() from them in place;
+    # only the rows a page ends up using are copied out.
+    def __init__(self, pool):
+        self._pool = pool
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, columns, dictionary=()):
+        # `columns` are select expressions; `dictionary` columns are dictionary-encoded.
+        # Each distinct selection of a table is loaded and kept on its own.
+        key = (name, tuple(columns), tuple(dictionary))
+        with self._lock:
+            if key not in self._tables:
+                with self._pool.cursor() as cur:
+                    table = cur.execute(f"select {', '.join(columns)} from {name}").fetch_arrow_table()
+                table = table.combine_chunks()
+                for col in dictionary:
+                    table = table.set_column(table.schema.get_field_index(col), col, pc.dictionary_encode(table[col]))
+                self._tables[key] = table
+            return self._tables[key]
+
+    def memory(self):
+        # Tables loaded with several selections are told apart by their columns
+        with self._lock:
+            names = [name for name, _, _ in self._tables]
+            return {name if names.count(name) == 1 else f"{name} ({', '.join(columns)})": (table.num_rows, table.nbytes)
+                    for (name, columns, _), table in self._tables.items()}
+
+
+@st.cache_resource(max_entries=2)
+def _shared_tables(store_version: str):
+    return SharedTables(_open_pool(store_version))
+
+
+def shared_table(name, columns, dictionary=(), version=None):
+    return _shared_tables(version or store_version()).get(name, columns, dictionary)
+
+
+def memory_report():
+    # (dataset, rows, bytes) for everything this module holds for the current store:
+    # the shared Arrow tables and the frames handed over by an in-process pipeline run
+    version = store_version()
+    report = [(name, rows, nbytes) for name, (rows, nbytes) in _shared_tables(version).memory().items()]
+    for name, df in _handed_over.get(version, {}).items():
+        report.append((f'{name} (handed over)', len(df), memory_bytes([df])))
+    return report
+
+
+def shared_dictionaries(frames, columns):
+    # One sorted dictionary per string column across all the frames, so the same
+    # value has the same code in every table and code order is string order
+    dictionaries = {}
+    for col in columns:
+        values = set()
+        for df in frames:
+            if col in df:
+                values.update(df[col].dropna().unique())
+        dictionaries[col] = pd.CategoricalDtype(sorted(values))
+    return dictionaries
+
+
+def compact(df, dictionaries=None, max_unique_ratio=0.5):
+    # Repeated strings are stored as categoricals (against a shared dictionary when
+    # one is given) and numbers in the narrowest dtype that holds them exactly.
+    # Groupbys on categorical keys need observed=True to stay on the codes.
+    dictionaries = dictionaries or {}
+    columns = {}
+    for col in df.columns:
+        values = columns[col] = df[col]
+        if col in dictionaries:
+            columns[col] = values.astype(dictionaries[col])
+        elif values.dtype == object:
+            if values.nunique() <= len(values) * max_unique_ratio:
+                columns[col] = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values):
+            columns[col] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values):
+            narrow = values.astype(np.float32)
+            if np.array_equal(narrow.to_numpy(np.float64), values.to_numpy(np.float64), equal_nan=True):
+                columns[col] = narrow
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_bytes(frames):
+    return sum(int(df.memory_usage(index=True, deep=True).sum()) for df in frames)
@@ -0,0 +1,113 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class FigureCache:
+    # Bounded LRU of built figures, shared by every session of the server. The key
+    # has to capture everything a figure depends on: the filter state and the
+    # dataset version it was built from.
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # Built outside the lock so sessions don't wait on each other; two sessions
+        # missing the same key at once both build it and the last one is kept
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+                    'entries': len(self._entries), 'max_entries': self.max_entries}
+
+
+class DiskCache:
+    # Size-bounded LRU of encoded images (bytes) in a local directory, shared by
+    # every session and every process on the machine. A file's mtime is its last
+    # use: hits touch it and eviction removes the least recently used files once
+    # the directory grows past max_bytes. Files are written under a temporary name
+    # and renamed into place, so a reader never sees a partial image.
+    def __init__(self, directory, max_bytes=256 * 2**20, suffix='.png'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, digest + self.suffix)
+
+    def get_or_build(self, key, build):
+        # `build` returns the bytes to store, or None for nothing to show (not cached)
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return data
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.misses += 1
+        data = build()
+        if data is None:
+            return None
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+        return data
+
+    def _files(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return files
+
+    def _evict(self):
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process evicted it first
+                pass
+            total -= size
+
+    def stats(self):
+        files = self._files()
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+                    'entries': len(files), 'bytes': sum(size for _, size, _ in files), 'max_bytes': self.max_bytes}
@@ -1,18 +1,37 @@
-import subprocess
+import argparse
 import sys
+import traceback
+
+import datastore
+import profiling
+from dataprocessing import PipelineConfig, run_pipeline
 
 def main():
+    parser = argparse.ArgumentParser(description="Process the datasets and launch the dashboard")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile every processing stage and compare with the previous run")
+    args = parser.parse_args()
+
+    # The pipeline and the dashboard share this interpreter, so the libraries are
+    # imported once and the freshly built tables go straight to the dashboard
     print("Running data processing...")
-    result = subprocess.run([sys.executable, "dataprocessing.py"], check=True)
-    
-    if result.returncode == 0:
-        print("Data processing completed successfully!")
-        print("\nLaunching Streamlit dashboard...")
-        subprocess.run(["streamlit", "run", "dash1.py"])
-    else:
+    config = PipelineConfig(output_format="parquet", profile=args.profile, keep_tables=True)
+    try:
+        result = run_pipeline(config)
+    except Exception:
+        traceback.print_exc()
         print("Data processing failed!")
         sys.exit(1)
 
+    print("Data processing completed successfully!")
+    if result.report:
+        profiling.print_report(result.report, config.report_path)
+    datastore.hand_over(result.tables)
+
+    print("\nLaunching Streamlit dashboard...")
+    from streamlit.web import cli as stcli
+    sys.exit(stcli.main(["run", "dash1.py"]))
+
 
 if __name__ == "__main__":
     main()
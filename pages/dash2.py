@@ -1,15 +1,21 @@
 import streamlit as st
 import pandas as pd
 from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import os
-import numpy as np
+import io
+import pyarrow.compute as pc
 import plotly.graph_objects as go
+from datastore import DATASET_DIR, store_version, compact, shared_table, memory_report
+from figcache import FigureCache, DiskCache
+from reviewindex import ReviewIndex
+from termcounts import TermCounts
+from timings import RerunTimer
 
 # ===========================================
 # PAGE CONFIG
 # ===========================================
 st.set_page_config(page_title="Book Reviews Dashboard", layout="wide")
+timer = RerunTimer('dash2')
 
 st.markdown("""
 <style>
@@ -157,28 +163,59 @@ st.markdown('<div class="dashboard-wrapper">', unsafe_allow_html=True)
 # LOAD DATA
 # ===========================================
 @st.cache_data
-def load_data():
-    df = pd.read_csv("./dataset/books_reviews_clean.csv")
-    df = df.copy()
-    df = df.rename(columns={"category_level_3_detail": "category"})
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    return df
-
-books_reviews = load_data()
-
-# ===========================================
-# BANNED WORD LIST
-# ===========================================
-author_words = set(
-    w.lower()
-    for full_name in books_reviews["author_name"].dropna().unique()
-    for w in full_name.split()
-)
-extra_banned = {"book", "one"}
-BANNED_WORDS = author_words.union(extra_banned)
-
-def filter_words(text):
-    return " ".join([w for w in text.split() if w.lower() not in BANNED_WORDS])
+def load_network_graph(mtime: float):
+    with open("./dataset/Author_to_Books.html", "r", encoding="utf-8") as f:
+        return f.read()
+
+# The reviews are held once per process as a read-only Arrow table, authors and
+# categories dictionary-encoded; see datastore.SharedTables
+REVIEW_COLUMNS = ['author_name', 'category_level_3_detail as category', 'date', 'sentiment_rating',
+                  'helpful_vote', 'text']
+
+def shared_reviews(version: str):
+    return shared_table('reviews', REVIEW_COLUMNS, dictionary=['author_name', 'category'], version=version)
+
+# Posting lists of the authors and categories over the date-ordered reviews, and
+# the categories of each author for the cascading filter; see ReviewIndex
+@st.cache_resource(max_entries=2)
+def review_index(version: str):
+    return ReviewIndex(shared_reviews(version), ['author_name', 'category'])
+
+# Review counts by author, category, day and sentiment, indexed the same way as
+# the reviews; the pie and trend sum its rows instead of counting reviews
+CUBE_COLUMNS = ['author_name', 'category', 'date', 'sentiment_rating', 'reviews']
+
+def shared_cube(version: str):
+    return shared_table('sentiment_cube', CUBE_COLUMNS, dictionary=['author_name', 'category'], version=version)
+
+@st.cache_resource(max_entries=2)
+def cube_index(version: str):
+    return ReviewIndex(shared_cube(version), ['author_name', 'category'])
+
+# Word counts of every review, tokenized by the pipeline; see TermCounts
+@st.cache_resource(max_entries=2)
+def term_counts(version: str):
+    return TermCounts(shared_table('review_terms', ['review', 'term', 'n'], version=version),
+                      shared_table('terms', ['word', 'banned', 'singular'], version=version),
+                      review_index(version).num_rows)
+
+# Outputs of the review sections, shared by all sessions
+@st.cache_resource
+def section_cache():
+    return FigureCache(max_entries=128)
+
+# Rendered word clouds as PNG files on local disk, shared by every session and
+# every dashboard process; popular selections stay while rarer ones are evicted
+WORDCLOUD_CACHE_DIR = os.path.join(DATASET_DIR, 'cache', 'wordclouds')
+
+@st.cache_resource
+def wordcloud_cache():
+    return DiskCache(WORDCLOUD_CACHE_DIR, max_bytes=256 * 2**20)
+
+version = store_version()
+with timer.section('load/review_index'):
+    index = review_index(version)
+all_authors = index.values['author_name']
 
 # ===========================================
 # TOP — CLEAN TITLE ONLY (NO BOXES)
@@ -196,92 +233,151 @@ st.markdown("<br>", unsafe_allow_html=True)
 # FILTERS IN ONE CLEAN ROW (NO DARK BOXES)
 # ===========================================
 
-# Prepare filtered base
-base = books_reviews.copy()
-
 # Define 3 columns for the filters
 col_a, col_b, col_c = st.columns([1, 1, 2])
 
 # --- Filter by Author ---
 with col_a:
-    authors_available = sorted(base["author_name"].dropna().unique().tolist())
-    author_filter = st.multiselect("Filter by author", authors_available)
-    df_after_author = base[base["author_name"].isin(author_filter)] if author_filter else base
+    author_filter = st.multiselect("Filter by author", all_authors)
 
 # --- Filter by Category ---
 with col_b:
-    categories_available = sorted(df_after_author["category"].dropna().unique().tolist())
+    with timer.section('filter/categories'):
+        categories_available = index.options('category', {'author_name': author_filter})
     category_filter = st.multiselect("Filter by category", categories_available)
-    df_after_category = df_after_author[df_after_author["category"].isin(category_filter)] if category_filter else df_after_author
 
 # --- Date Range Slider (FULL WIDTH of col_c) ---
 with col_c:
-    min_date = df_after_category["date"].min()
-    max_date = df_after_category["date"].max()
+    with timer.section('filter/date_bounds'):
+        date_bounds = index.date_bounds({'author_name': author_filter, 'category': category_filter})
 
-    if pd.isna(min_date) or pd.isna(max_date):
+    # Whole days, so that the day-level sentiment cube answers exactly what the reviews would
+    if date_bounds is None:
         date_range = None
         st.warning("No valid dates available.")
     else:
+        min_date, max_date = (pd.Timestamp(d).date() for d in date_bounds)
         date_range = st.slider(
             "Date range",
-            min_value=min_date.to_pydatetime(),
-            max_value=max_date.to_pydatetime(),
-            value=(min_date.to_pydatetime(), max_date.to_pydatetime()),
+            min_value=min_date,
+            max_value=max_date,
+            value=(min_date, max_date),
             key="date_slider",
         )
 
+# Filter inputs read by each section. Sections are cached under just those inputs
+# and only rebuilt when one of them changes; the network graph reads none.
+SECTION_INPUTS = {
+    'network_graph': [],
+    'wordclouds': ['authors', 'categories', 'date_range'],
+    'review_cards': ['authors', 'categories', 'date_range'],
+    'sentiment': ['authors', 'categories', 'date_range'],
+}
+filters = {'authors': tuple(author_filter), 'categories': tuple(category_filter),
+           'date_range': tuple(date_range) if date_range else None}
+
+def cached_section(section, name, build, cache=None, key=()):
+    # `key` adds whatever else the output depends on; `cache` defaults to the section cache
+    state = tuple(filters[input_name] for input_name in SECTION_INPUTS[section])
+    built = []
+    def build_once():
+        built.append(True)
+        return build()
+    with timer.section(f'{section}/{name}') as timed:
+        value = (cache or section_cache()).get_or_build((section, name, version) + state + key, build_once)
+        timed.note(cache='miss' if built else 'hit')
+    return value
+
 # ===========================================
 # APPLY FILTERS
 # ===========================================
-df_filtered = df_after_category.copy()
-
-if date_range:
-    df_filtered = df_filtered[
-        (df_filtered["date"] >= date_range[0]) &
-        (df_filtered["date"] <= date_range[1])
-    ]
-
-# Sampling info stays here, but now full-width
-if len(df_filtered) > 10000:
-    st.warning(f"Filtered dataset has {len(df_filtered)} rows — using 10,000-row sample.")
-    df_filtered = df_filtered.sample(10000, random_state=42)
+# The filters are composed into one array of row numbers of the shared reviews,
+# merged from the author and category posting lists and cut to the date range by
+# binary search. Sections then gather just the columns they need for just those
+# rows, so a rerun allocates in proportion to the selection, not the table, and
+# nothing needs to be sampled. Both are worked out at most once per rerun, when
+# some section has to be rebuilt.
+selections = {'author_name': author_filter, 'category': category_filter}
+
+loaded = {}
+def selected_rows():
+    if 'rows' not in loaded:
+        with timer.section('filter/reviews') as timed:
+            loaded['rows'] = index.select(selections, date_range)
+            timed.note(rows=len(loaded['rows']))
+    return loaded['rows']
+
+# Cube rows of the selection: day, sentiment and number of reviews
+def selected_cube():
+    if 'cube' not in loaded:
+        with timer.section('filter/cube') as timed:
+            rows = cube_index(version).select(selections, date_range)
+            cube = shared_cube(version).select(['date', 'sentiment_rating', 'reviews']).take(rows)
+            loaded['cube'] = compact(cube.to_pandas())
+            timed.note(rows=len(rows))
+    return loaded['cube']
+
+def gather(rows, columns):
+    # Copies these columns of these rows out of the shared reviews
+    with timer.section('filter/gather') as timed:
+        df = compact(shared_reviews(version).select(columns).take(rows).to_pandas())
+        timed.note(rows=len(rows), columns=len(columns))
+    return df
 
 st.markdown("<br>", unsafe_allow_html=True)
 
 # ===========================================
 # WORDCLOUD FUNCTION
 # ===========================================
-def generate_wordcloud(text_data, colormap):
-    text_data = [filter_words(str(t)) for t in text_data if pd.notna(t)]
-    full_text = " ".join(text_data)
-    if not full_text.strip():
-        return None
-
-    return WordCloud(
-        width=1600, height=800,
-        background_color="white",
-        colormap=colormap,
-        max_words=200,
-        collocations=False,
-        prefer_horizontal=1.0,
-    ).generate(full_text)
-
-# Sentiment subsets
-negative_df = df_filtered[df_filtered["sentiment_rating"] == 0]
-positive_df = df_filtered[df_filtered["sentiment_rating"] == 2]
-
-# Most helpful reviews
-most_helpful_neg = negative_df.sort_values("helpful_vote", ascending=False).head(1)
-most_helpful_pos = positive_df.sort_values("helpful_vote", ascending=False).head(1)
-
-neg_author = most_helpful_neg["author_name"].values[0] if not most_helpful_neg.empty else ""
-neg_votes  = most_helpful_neg["helpful_vote"].values[0] if not most_helpful_neg.empty else ""
-neg_text   = most_helpful_neg["text"].values[0] if not most_helpful_neg.empty else "No negative review available."
+WORDCLOUD_OPTIONS = dict(
+    width=1600, height=800,
+    background_color="white",
+    max_words=200,
+    collocations=False,
+    prefer_horizontal=1.0,
+)
 
-pos_author = most_helpful_pos["author_name"].values[0] if not most_helpful_pos.empty else ""
-pos_votes  = most_helpful_pos["helpful_vote"].values[0] if not most_helpful_pos.empty else ""
-pos_text   = most_helpful_pos["text"].values[0] if not most_helpful_pos.empty else "No positive review available."
+def render_wordcloud(frequencies, colormap):
+    if not frequencies:
+        return None
+    image = WordCloud(colormap=colormap, **WORDCLOUD_OPTIONS).generate_from_frequencies(frequencies).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+# PNG bytes of a word cloud, laid out only if no process has rendered it yet
+def wordcloud_png(name, rating, colormap):
+    return cached_section('wordclouds', name, lambda: render_wordcloud(sentiment_frequencies(rating), colormap),
+                          cache=wordcloud_cache(), key=(rating, colormap, WORDCLOUD_OPTIONS))
+
+# Selected rows with one sentiment
+def sentiment_rows(rating):
+    rows = selected_rows()
+    ratings = shared_reviews(version)['sentiment_rating'].take(rows)
+    return rows[pc.fill_null(pc.equal(ratings, rating), False).to_numpy(zero_copy_only=False)]
+
+# Word clouds sum the term counts of the selected reviews; no text is read
+def sentiment_frequencies(rating):
+    rows = sentiment_rows(rating)
+    with timer.section('filter/term_counts') as timed:
+        frequencies = term_counts(version).frequencies(rows, max_words=WORDCLOUD_OPTIONS['max_words'])
+        timed.note(rows=len(rows))
+    return frequencies
+
+# Most helpful reviews; only the winning row's author and text are gathered
+def most_helpful(rating, empty_text):
+    rows = sentiment_rows(rating)
+    votes = gather(rows, ["helpful_vote"])["helpful_vote"]
+    if votes.empty:
+        return "", "", empty_text
+    top = votes.sort_values(ascending=False, kind="stable").index[0]
+    card = gather(rows[top:top + 1], ["author_name", "text"])
+    return card["author_name"].values[0], votes.values[top], card["text"].values[0]
+
+neg_author, neg_votes, neg_text = cached_section('review_cards', 'negative',
+                                                 lambda: most_helpful(0, "No negative review available."))
+pos_author, pos_votes, pos_text = cached_section('review_cards', 'positive',
+                                                 lambda: most_helpful(2, "No positive review available."))
 
 # ===========================================
 # FIXED-HEIGHT REVIEW CARD RENDER FUNCTION
@@ -303,8 +399,8 @@ def render_review_card(title, author, votes, text, accent_color):
 st.markdown('<div class="section-label">Author–Books Network Graph</div>', unsafe_allow_html=True)
 
 try:
-    with open("./dataset/Author_to_Books.html", "r", encoding="utf-8") as f:
-        graph_html = f.read()
+    with timer.section('network_graph/html'):
+        graph_html = load_network_graph(os.path.getmtime("./dataset/Author_to_Books.html"))
     st.components.v1.html(graph_html, height=600, scrolling=True) # type: ignore
 except FileNotFoundError:
     st.error("❌ Author_to_Books.html not found.")
@@ -320,12 +416,10 @@ pos_col_wc, pos_col_card = st.columns([1.6, 1.0])
 
 with pos_col_wc:
     st.markdown('<div class="section-label">Positive Sentiment Word Cloud</div>', unsafe_allow_html=True)
-    pos_wc = generate_wordcloud(positive_df["clean_text"].tolist(), "Greens")
+    pos_wc = wordcloud_png('positive', 2, "Greens")
     if pos_wc:
-        fig, ax = plt.subplots(figsize=(6, 4))
-        ax.imshow(pos_wc, interpolation="bilinear")
-        ax.axis("off")
-        st.pyplot(fig, use_container_width=True)
+        with timer.section('render/wordcloud_positive'):
+            st.image(pos_wc, use_container_width=True)
     else:
         st.info("No positive reviews found.")
 
@@ -342,12 +436,10 @@ neg_col_wc, neg_col_card = st.columns([1.6, 1.0])
 
 with neg_col_wc:
     st.markdown('<div class="section-label">Negative Sentiment Word Cloud</div>', unsafe_allow_html=True)
-    neg_wc = generate_wordcloud(negative_df["clean_text"].tolist(), "Reds")
+    neg_wc = wordcloud_png('negative', 0, "Reds")
     if neg_wc:
-        fig, ax = plt.subplots(figsize=(6, 4))
-        ax.imshow(neg_wc, interpolation="bilinear")
-        ax.axis("off")
-        st.pyplot(fig, use_container_width=True)
+        with timer.section('render/wordcloud_negative'):
+            st.image(neg_wc, use_container_width=True)
     else:
         st.info("No negative reviews found.")
 
@@ -362,40 +454,44 @@ bottom_col1, bottom_col2 = st.columns(2)
 
 with bottom_col1:
     st.markdown('<div class="section-label">Sentiment Distribution</div>', unsafe_allow_html=True)
-    sentiment_counts = df_filtered["sentiment_rating"].value_counts().reindex([0,1,2], fill_value=0)
-    labels = ["Negative", "Neutral", "Positive"]
-    values = sentiment_counts.values
-    colors = ["#ef4444", "#6b7280", "#22c55e"]
-
-    fig_pie = go.Figure(
-        data=[go.Pie(
-            labels=labels,
-            values=values,
-            hole=0.58,
-            marker=dict(colors=colors),
-            textinfo="label+percent",
-        )]
-    )
-    fig_pie.update_layout(
-        showlegend=False,
-        height=260,
-        margin=dict(l=10, r=10, t=10, b=10),
-        paper_bgcolor="#020617",
-        plot_bgcolor="#020617",
-        font=dict(color="#e5e7eb"),
-    )
-    st.plotly_chart(fig_pie, use_container_width=True)
+    def build_sentiment_pie():
+        cube = selected_cube()
+        sentiment_counts = cube.groupby("sentiment_rating")["reviews"].sum().reindex([0,1,2], fill_value=0)
+        labels = ["Negative", "Neutral", "Positive"]
+        values = sentiment_counts.values
+        colors = ["#ef4444", "#6b7280", "#22c55e"]
+
+        fig_pie = go.Figure(
+            data=[go.Pie(
+                labels=labels,
+                values=values,
+                hole=0.58,
+                marker=dict(colors=colors),
+                textinfo="label+percent",
+            )]
+        )
+        fig_pie.update_layout(
+            showlegend=False,
+            height=260,
+            margin=dict(l=10, r=10, t=10, b=10),
+            paper_bgcolor="#020617",
+            plot_bgcolor="#020617",
+            font=dict(color="#e5e7eb"),
+        )
+        return fig_pie
+
+    st.plotly_chart(cached_section('sentiment', 'pie', build_sentiment_pie), use_container_width=True)
 
 with bottom_col2:
     st.markdown('<div class="section-label">Sentiment Trend Over Time</div>', unsafe_allow_html=True)
 
-    df_time = df_filtered.dropna(subset=["date"]).copy()
-    if df_time.empty:
-        st.info("No data with valid dates.")
-    else:
-        df_time["is_positive"] = (df_time["sentiment_rating"] == 2).astype(int)
-        df_time["is_negative"] = (df_time["sentiment_rating"] == 0).astype(int)
-        monthly = df_time.set_index("date").resample("M").sum()
+    def build_trend():
+        df_time = selected_cube().dropna(subset=["date"])
+        if df_time.empty:
+            return None
+        df_time = df_time.assign(is_positive=df_time["reviews"].where(df_time["sentiment_rating"] == 2, 0),
+                                 is_negative=df_time["reviews"].where(df_time["sentiment_rating"] == 0, 0))
+        monthly = df_time.set_index("date")[["is_positive", "is_negative"]].resample("M").sum()
 
         fig_trend = go.Figure()
         fig_trend.add_trace(go.Scatter(
@@ -419,10 +515,30 @@ with bottom_col2:
             font=dict(color="#e5e7eb"),
             legend=dict(orientation="h", y=1.02, x=1),
         )
+        return fig_trend
+
+    fig_trend = cached_section('sentiment', 'trend', build_trend)
+    if fig_trend is None:
+        st.info("No data with valid dates.")
+    else:
         st.plotly_chart(fig_trend, use_container_width=True)
 
 
 
+# Add ?cache_stats to the URL to see the section cache and what this process holds in memory
+if 'cache_stats' in st.query_params:
+    stats = section_cache().stats()
+    st.caption(f"Section cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+               f"{stats['entries']}/{stats['max_entries']} entries")
+    stats = wordcloud_cache().stats()
+    st.caption(f"Word cloud cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+               f"{stats['entries']} images, {stats['bytes'] / 2**20:,.1f}/{stats['max_bytes'] / 2**20:,.0f} MiB")
+    for dataset, rows, nbytes in memory_report():
+        st.caption(f"{dataset}: {rows:,} rows, {nbytes / 2**20:,.1f} MiB")
+    st.caption(f"review index: {index.num_rows:,} rows, {index.nbytes() / 2**20:,.1f} MiB")
+
+timer.finish()
+
 if st.button("Back to Main Dashboard"):
     st.switch_page("dash1.py")
 
@@ -0,0 +1,153 @@
+import json
+import os
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS = ['wall_s', 'cpu_s', 'peak_rss_bytes', 'input_rows', 'output_rows', 'output_bytes']
+
+
+class ProfiledCursor:
+    # Forwards to a DuckDB cursor and keeps the EXPLAIN ANALYZE profile of every query run through it
+    def __init__(self, cur):
+        self._cur = cur
+        self.plans = []
+        cur.execute("set enable_profiling = 'no_output'")
+
+    def execute(self, sql, *args):
+        result = self._cur.execute(sql, *args)
+        self.plans.append(json.loads(self._cur.get_profiling_information(format='json')))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+def reset_peak_rss():
+    # Linux can reset the high-water mark, so each stage reports its own peak.
+    # Returns False where it cannot, and the peak is then the whole process's.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Elsewhere only the peak since the process started is available
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def row_count(cur, tables):
+    return sum(cur.execute(f"select count(*) from {t}").fetchone()[0] for t in tables)
+
+
+class Profiler:
+    # Collects per-stage measurements while the pipeline runs. Stages are timed
+    # one at a time: CPU time and peak RSS are process-wide, so they are only
+    # attributable to a stage when nothing else runs alongside it.
+    def __init__(self, stages):
+        self.stages = stages
+        self.results = {}
+        self.started = time.perf_counter()
+
+    def run(self, stage, cur):
+        input_tables = [t for dep in stage.inputs for t in self.stages[dep].tables + self.stages[dep].views]
+        profiled = ProfiledCursor(cur)
+        per_stage_peak = reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        stage.run(profiled)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        produced = stage.tables + stage.views + stage.exports
+        self.results[stage.name] = {
+            'status': 'built',
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'peak_rss_scope': 'stage' if per_stage_peak else 'process',
+            'input_rows': row_count(cur, input_tables),
+            # Rows the stage leaves behind or writes out; downloads copy files whose rows are not counted
+            'output_rows': row_count(cur, produced) if produced else None,
+            'output_bytes': sum(os.path.getsize(p) for p in stage.outputs),
+            'plans': profiled.plans,
+        }
+
+    def skip(self, stage):
+        self.results[stage.name] = {'status': 'skipped'}
+
+    def report(self, **settings):
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'settings': settings,
+            'total_wall_s': time.perf_counter() - self.started,
+            'stages': self.results,
+        }
+
+
+def compare(previous, current):
+    # Per stage and metric: previous value, current value and relative change
+    comparison = {}
+    for name, stage in current['stages'].items():
+        before = previous['stages'].get(name) if previous else None
+        if stage['status'] != 'built' or not before or before.get('status') != 'built':
+            continue
+        comparison[name] = {}
+        for metric in METRICS:
+            old, new = before.get(metric), stage.get(metric)
+            change = (new - old) / old if old and new is not None else None
+            # A process-wide peak says nothing about a stage's own peak
+            if metric == 'peak_rss_bytes' and before.get('peak_rss_scope') != stage.get('peak_rss_scope'):
+                change = None
+            comparison[name][metric] = {'previous': old, 'current': new, 'change': change}
+    return comparison
+
+
+def load_report(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def print_report(report, path, slower=0.25, min_seconds=0.05):
+    # Stages whose wall time grew by more than `slower` (and `min_seconds`) are flagged;
+    # peaks marked * are the whole process's, as this platform cannot reset them per stage
+    print(f"\n{'stage':<28}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}{'rows in':>10}{'rows out':>10}{'MB out':>8}  vs previous")
+    for name, stage in report['stages'].items():
+        if stage['status'] != 'built':
+            continue
+        wall = report['comparison'].get(name, {}).get('wall_s')
+        flag = ''
+        if wall and wall['change'] is not None:
+            regressed = wall['change'] > slower and wall['current'] - wall['previous'] > min_seconds
+            flag = f"{wall['change']:+.0%}" + ('  <-- slower' if regressed else '')
+        rss = f"{stage['peak_rss_bytes'] / 2**20:.1f}" if stage['peak_rss_bytes'] is not None else '-'
+        if stage.get('peak_rss_scope') == 'process':
+            rss += '*'
+        rows_out = stage['output_rows'] if stage['output_rows'] is not None else '-'
+        print(f"{name:<28}{stage['wall_s']:>9.3f}{stage['cpu_s']:>9.3f}{rss:>9}"
+              f"{stage['input_rows']:>10}{rows_out:>10}{stage['output_bytes'] / 2**20:>8.2f}  {flag}")
+    print(f"total {report['total_wall_s']:.2f}s, report saved to {path}")
+    if any(stage.get('peak_rss_scope') == 'process' for stage in report['stages'].values()):
+        print("* peak memory of the whole process so far; it cannot be reset per stage here")
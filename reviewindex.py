@@ -0,0 +1,120 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+class ReviewIndex:
+    # Inverted indexes over a table of reviews laid out in date order, undated rows
+    # last, as the serving store holds them. Every value of an indexed column has a
+    # posting list: the sorted positions of its rows. A selection merges the posting
+    # lists of the chosen values, intersects the columns and cuts the date range out
+    # with a binary search, so it costs in proportion to the rows selected, not to
+    # the table. The options a column offers given selections on the columns before
+    # it (e.g. the categories of some authors) are precomputed per value.
+    def __init__(self, table, columns):
+        dates = table['date']
+        self.num_rows = len(dates)
+        self._n_dated = self.num_rows - dates.null_count
+        self._dates = dates.slice(0, self._n_dated).to_numpy()
+        if dates.slice(0, self._n_dated).null_count or (self._dates[1:] < self._dates[:-1]).any():
+            raise ValueError("reviews must be sorted by date with undated rows last")
+
+        self.columns = list(columns)
+        self.values, self._codes, self._postings, row_codes = {}, {}, {}, {}
+        for col in self.columns:
+            encoded = table[col].combine_chunks()
+            if not pa.types.is_dictionary(encoded.type):
+                encoded = pc.dictionary_encode(encoded)
+            # Codes are renumbered so that code order is value order
+            names = np.array(encoded.dictionary.to_pylist(), dtype=object)
+            order = np.argsort(names, kind='stable')
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            raw = pc.fill_null(encoded.indices, -1).to_numpy()
+            codes = np.where(raw >= 0, rank[np.maximum(raw, 0)], -1)
+
+            positions = np.flatnonzero(codes >= 0).astype(np.int32)
+            # A stable sort by code keeps each posting list in row order
+            positions = positions[np.argsort(codes[positions], kind='stable')]
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[positions], minlength=len(names)))])
+            self.values[col] = names[order].tolist()
+            self._codes[col] = {name: code for code, name in enumerate(self.values[col])}
+            self._postings[col] = (positions, offsets)
+            row_codes[col] = codes
+
+        # For each pair of columns, the sorted codes of the second found with each value of the first
+        self._options = {}
+        for i, col in enumerate(self.columns):
+            for other in self.columns[i + 1:]:
+                both = (row_codes[col] >= 0) & (row_codes[other] >= 0)
+                width = len(self.values[other])
+                pairs = np.unique(row_codes[col][both] * width + row_codes[other][both])
+                offsets = np.searchsorted(pairs // width, np.arange(len(self.values[col]) + 1))
+                self._options[col, other] = (pairs % width, offsets)
+
+    def postings(self, col, selected):
+        # Sorted positions of the rows holding any of the selected values
+        positions, offsets = self._postings[col]
+        codes = [self._codes[col][v] for v in selected if v in self._codes[col]]
+        lists = [positions[offsets[c]:offsets[c + 1]] for c in codes]
+        if len(lists) == 1:
+            return lists[0]
+        if not lists:
+            return positions[:0]
+        # Timsort merges the already sorted lists
+        return np.sort(np.concatenate(lists), kind='stable')
+
+    def select(self, selections, date_range=None):
+        # Sorted row positions matching every selection ({column: values}, empty
+        # meaning all) and, if given, the date range: (first day, last day), whole days
+        rows = None
+        for col in self.columns:
+            if selections.get(col):
+                posting = self.postings(col, selections[col])
+                rows = posting if rows is None else _intersect(rows, posting)
+        if date_range is None:
+            return np.arange(self.num_rows, dtype=np.int32) if rows is None else rows
+        first, last = (np.datetime64(day, 'D').astype(self._dates.dtype) for day in date_range)
+        lo = np.searchsorted(self._dates, first, side='left')
+        hi = np.searchsorted(self._dates, last + np.timedelta64(1, 'D'), side='left')
+        if rows is None:
+            return np.arange(lo, hi, dtype=np.int32)
+        return rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+
+    def date_bounds(self, selections):
+        # First and last date of the selected rows, or None if none of them is dated
+        if not any(selections.get(col) for col in self.columns):
+            return (self._dates[0], self._dates[-1]) if self._n_dated else None
+        rows = self.select(selections)
+        last = np.searchsorted(rows, self._n_dated)
+        if last == 0:
+            return None
+        return self._dates[rows[0]], self._dates[rows[last - 1]]
+
+    def options(self, col, selections):
+        # Values of `col` found together with the selected values of the columns before it
+        codes = None
+        for other in self.columns[:self.columns.index(col)]:
+            if selections.get(other):
+                found, offsets = self._options[other, col]
+                lists = [found[offsets[c]:offsets[c + 1]]
+                         for c in (self._codes[other][v] for v in selections[other] if v in self._codes[other])]
+                union = np.unique(np.concatenate(lists)) if lists else found[:0]
+                codes = union if codes is None else _intersect(codes, union)
+        if codes is None:
+            return list(self.values[col])
+        return [self.values[col][c] for c in codes]
+
+    def nbytes(self):
+        pairs = list(self._postings.values()) + list(self._options.values())
+        return self._dates.nbytes + sum(a.nbytes + b.nbytes for a, b in pairs)
+
+
+def _intersect(a, b):
+    # Values of both sorted arrays: each value of the shorter one is looked up in the longer
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(b):
+        return a[:0]
+    found = np.searchsorted(b, a)
+    return a[b[np.minimum(found, len(b) - 1)] == a]
@@ -0,0 +1,36 @@
+import numpy as np
+import pyarrow.compute as pc
+
+
+class TermCounts:
+    # The pipeline's review-by-term counts as a sparse matrix in compressed row
+    # form: the terms of review r are terms[indptr[r]:indptr[r + 1]]. The word
+    # frequencies of any set of reviews are the sum of their rows, so a word cloud
+    # needs no text at all. Banned terms are left out and plurals are counted with
+    # their singular when both occur, as WordCloud does when it reads text itself.
+    def __init__(self, review_terms, terms, num_rows):
+        # `review_terms` is ordered by review; `terms` by term id
+        reviews = review_terms['review'].to_numpy()
+        self._indptr = np.searchsorted(reviews, np.arange(num_rows + 1))
+        self._terms = review_terms['term'].to_numpy()
+        self._counts = review_terms['n'].to_numpy()
+        self.words = terms['word'].to_pylist()
+        self._banned = terms['banned'].to_numpy(zero_copy_only=False)
+        self._singular = pc.fill_null(terms['singular'], -1).to_numpy()
+
+    def frequencies(self, rows, max_words=200):
+        # {word: count} of the most frequent words over the given reviews
+        starts = self._indptr[rows]
+        lengths = self._indptr[np.asarray(rows) + 1] - starts
+        # Positions of every entry of the selected rows, without a Python loop
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        counts = np.bincount(self._terms[entries], weights=self._counts[entries], minlength=len(self.words))
+        counts[self._banned] = 0
+
+        plurals = np.flatnonzero((self._singular >= 0) & (counts > 0))
+        plurals = plurals[counts[self._singular[plurals]] > 0]
+        counts[self._singular[plurals]] += counts[plurals]
+        counts[plurals] = 0
+
+        top = np.argsort(-counts, kind='stable')[:max_words]
+        return {self.words[t]: int(counts[t]) for t in top if counts[t] > 0}
@@ -0,0 +1,89 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'bench'))
+
+import dataprocessing
+from dataprocessing import PipelineConfig, run_pipeline
+from synthetic import generate
+
+# The Kaggle file names of the generated inputs
+KAGGLE_FILES = {
+    'metadata.csv': 'amazon_books_metadata_sample_20k.csv',
+    'reviews.csv': 'amazon_books_reviews_sample_20k.csv',
+}
+
+
+class UpstreamChangeTest(unittest.TestCase):
+    # The download stages run every time against a stand-in for the kagglehub
+    # cache; what they copy decides which raw stages are rebuilt
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.upstream = os.path.join(self.tmp, 'kaggle')
+        generate(self.upstream, scale=0.005, seed=1)
+        for generated, name in KAGGLE_FILES.items():
+            os.replace(os.path.join(self.upstream, generated), os.path.join(self.upstream, name))
+        self.metadata = os.path.join(self.upstream, KAGGLE_FILES['metadata.csv'])
+        self.config = PipelineConfig(outdir=os.path.join(self.tmp, 'dataset'), output_format='parquet',
+                                     stages=['write_processed_metadata', 'books_reviews'], workers=2)
+        patcher = mock.patch.object(dataprocessing.kagglehub, 'dataset_download', return_value=self.upstream)
+        self.download = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def run_pipeline(self):
+        return run_pipeline(self.config).status
+
+    def bump_mtime(self, path):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_unchanged_upstream_skips_raw_stages(self):
+        self.run_pipeline()
+        status = self.run_pipeline()
+        self.assertEqual(status['download_books'], 'built')
+        self.assertEqual(status['books_metadata'], 'skipped')
+        self.assertEqual(status['processed_metadata'], 'skipped')
+        self.assertEqual(status['books_reviews'], 'skipped')
+
+    def test_changed_upstream_rebuilds(self):
+        self.run_pipeline()
+        metadata = pd.read_csv(self.metadata)
+        metadata.iloc[:-1].to_csv(self.metadata, index=False)
+        self.bump_mtime(self.metadata)
+
+        status = self.run_pipeline()
+        self.assertEqual(self.download.call_count, 2)
+        self.assertEqual(status['books_metadata'], 'built')
+        self.assertEqual(status['processed_metadata'], 'built')
+        self.assertEqual(status['books_reviews'], 'skipped')
+        processed = pd.read_parquet(os.path.join(self.config.outdir, 'processed_metadata.parquet'))
+        self.assertEqual(len(processed), len(metadata) - 1)
+
+    def test_touched_upstream_keeps_raw_stages(self):
+        # A new copy with the same contents hashes the same, so nothing is rebuilt
+        self.run_pipeline()
+        self.bump_mtime(self.metadata)
+        status = self.run_pipeline()
+        self.assertEqual(os.stat(self.config.metadata_path).st_mtime_ns, os.stat(self.metadata).st_mtime_ns)
+        self.assertEqual(status['books_metadata'], 'skipped')
+        self.assertEqual(status['processed_metadata'], 'skipped')
+
+    def test_no_download_uses_local_files(self):
+        self.run_pipeline()
+        self.config.download = False
+        status = self.run_pipeline()
+        self.assertEqual(self.download.call_count, 1)
+        self.assertEqual(status['download_books'], 'skipped')
+
+
+if __name__ == '__main__':
+    unittest.main()
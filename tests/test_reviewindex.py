@@ -0,0 +1,130 @@
+import os
+import sys
+import random
+import datetime
+import unittest
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reviewindex import ReviewIndex
+
+COLUMNS = ['author_name', 'category']
+
+
+def make_reviews(seed, n_rows=3000, n_undated=200):
+    # Reviews in date order with undated rows last, as the serving store lays them
+    # out; times fall anywhere in the day, and some rows lack an author or category
+    rng = np.random.default_rng(seed)
+    authors = [f'Author {i:02d}' for i in range(40)]
+    categories = [f'Category {i}' for i in range(12)]
+    start = np.datetime64('2005-01-01T00:00:00', 's').astype(np.int64)
+    seconds = np.sort(rng.integers(start, start + 10 * 365 * 86400, n_rows))
+    df = pd.DataFrame({
+        'author_name': rng.choice(authors, n_rows + n_undated),
+        'category': rng.choice(categories, n_rows + n_undated),
+        'date': pd.to_datetime(np.concatenate([seconds, np.full(n_undated, -1)]), unit='s'),
+    })
+    df.loc[n_rows:, 'date'] = pd.NaT
+    df.loc[rng.random(len(df)) < 0.02, 'author_name'] = None
+    df.loc[rng.random(len(df)) < 0.02, 'category'] = None
+    return df
+
+
+def expected(df, selections, date_range=None):
+    # Brute force: filter the whole frame
+    keep = pd.Series(True, index=df.index)
+    for col in COLUMNS:
+        if selections.get(col):
+            keep &= df[col].isin(selections[col])
+    if date_range is not None:
+        days = df['date'].dt.normalize()
+        keep &= days.between(pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]))
+    return np.flatnonzero(keep.to_numpy())
+
+
+class ReviewIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = make_reviews(seed=5)
+        table = pa.Table.from_pandas(cls.df, preserve_index=False)
+        cls.index = ReviewIndex(table, COLUMNS)
+        # The same reviews with dictionary-encoded columns, as the dashboard loads them
+        cls.encoded = ReviewIndex(table.set_column(0, 'author_name', table['author_name'].dictionary_encode()),
+                                  COLUMNS)
+
+    def random_selections(self, rng):
+        authors = sorted(self.df['author_name'].dropna().unique())
+        categories = sorted(self.df['category'].dropna().unique())
+        return {
+            'author_name': rng.sample(authors, rng.choice([0, 0, 1, 2, 5])),
+            'category': rng.sample(categories, rng.choice([0, 0, 1, 3])),
+        }
+
+    def random_range(self, rng):
+        first = datetime.date(2003, 1, 1) + datetime.timedelta(days=rng.randint(0, 14 * 365))
+        return first, first + datetime.timedelta(days=rng.randint(0, 5 * 365))
+
+    def test_select_matches_brute_force(self):
+        rng = random.Random(11)
+        for _ in range(300):
+            selections = self.random_selections(rng)
+            date_range = None if rng.random() < 0.3 else self.random_range(rng)
+            want = expected(self.df, selections, date_range)
+            for index in (self.index, self.encoded):
+                np.testing.assert_array_equal(index.select(selections, date_range), want,
+                                              err_msg=str((selections, date_range)))
+
+    def test_no_range_keeps_undated_rows(self):
+        rows = self.index.select({})
+        self.assertEqual(len(rows), len(self.df))
+        author = self.df['author_name'].iloc[-1]
+        rows = self.index.select({'author_name': [author]})
+        np.testing.assert_array_equal(rows, expected(self.df, {'author_name': [author]}))
+        self.assertTrue(self.df['date'].iloc[rows].isna().any())
+
+    def test_range_drops_undated_rows(self):
+        first, last = self.df['date'].min().date(), self.df['date'].max().date()
+        rows = self.index.select({}, (first, last))
+        np.testing.assert_array_equal(rows, np.flatnonzero(self.df['date'].notna().to_numpy()))
+
+    def test_empty_selections_select_everything(self):
+        np.testing.assert_array_equal(self.index.select({'author_name': [], 'category': []}),
+                                      np.arange(len(self.df)))
+        self.assertEqual(self.index.options('category', {'author_name': []}), self.index.values['category'])
+
+    def test_range_outside_data(self):
+        for date_range in [('1990-01-01', '1999-12-31'), ('2030-01-01', '2031-01-01')]:
+            self.assertEqual(len(self.index.select({}, date_range)), 0)
+            self.assertEqual(len(self.index.select({'category': ['Category 1']}, date_range)), 0)
+
+    def test_unknown_value_selects_nothing(self):
+        self.assertEqual(len(self.index.select({'author_name': ['Nobody']})), 0)
+
+    def test_options_match_brute_force(self):
+        rng = random.Random(12)
+        for _ in range(100):
+            selections = self.random_selections(rng)
+            rows = self.df.iloc[expected(self.df, {'author_name': selections['author_name']})]
+            want = sorted(rows['category'].dropna().unique())
+            self.assertEqual(self.index.options('category', selections), want, selections)
+        self.assertEqual(self.index.options('author_name', {'category': ['Category 1']}),
+                         self.index.values['author_name'])
+
+    def test_date_bounds_match_brute_force(self):
+        rng = random.Random(13)
+        for _ in range(100):
+            selections = self.random_selections(rng)
+            dates = self.df['date'].iloc[expected(self.df, selections)].dropna()
+            bounds = self.index.date_bounds(selections)
+            if dates.empty:
+                self.assertIsNone(bounds)
+            else:
+                self.assertEqual([pd.Timestamp(d) for d in bounds], [dates.min(), dates.max()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import re
+import random
+import shutil
+import tempfile
+import unittest
+
+import duckdb
+import pandas as pd
+from wordcloud import WordCloud
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'bench'))
+
+from dataprocessing import PipelineConfig, run_pipeline, SERVING_ORDER, EXTRA_BANNED_WORDS
+from reviewindex import ReviewIndex
+from termcounts import TermCounts
+from synthetic import generate
+
+# Text the generated reviews lack: plurals with and without their singular,
+# possessives, numbers and stopwords. Like clean_text it is lower case, and
+# author names are written without their punctuation.
+PHRASES = [
+    "the books were great, the author's ending too",
+    "stories and more stories; one story stood out",
+    "characters, characters' names and 1984 twists",
+    "kindle kindles series series's",
+    "it's 3 am and i can't stop: pages, page, pages",
+    "glass glasses class classes bus",
+]
+
+
+class TermCountsTest(unittest.TestCase):
+    # The pipeline's review-by-term counts against WordCloud reading the text of
+    # the same reviews, the way the dashboard built its clouds before
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        outdir = os.path.join(cls.tmp, 'dataset')
+        generate(outdir, scale=0.005, seed=3)
+        clean_path = os.path.join(outdir, 'books_reviews_clean.csv')
+        clean = pd.read_csv(clean_path, dtype=str, keep_default_na=False)
+        rng = random.Random(4)
+        authors = [a for a in clean['author_name'].unique() if a]
+        for i in range(0, len(clean), 7):
+            words = rng.sample(PHRASES, 2) + [re.sub(r'[^\w\s]', '', rng.choice(authors).lower())]
+            clean.loc[i, 'clean_text'] = ' '.join(words + [clean.loc[i, 'clean_text']])
+        clean.to_csv(clean_path, index=False)
+
+        run_pipeline(PipelineConfig(outdir=outdir, output_format='parquet', stages=['review_terms'],
+                                    workers=2, download=False))
+        con = duckdb.connect(os.path.join(outdir, 'pipeline.duckdb'), read_only=True)
+        try:
+            reviews = con.execute(f"select author_name, category_level_3_detail as category, date, clean_text "
+                                  f"from reviews order by {SERVING_ORDER['reviews']}").to_arrow_table()
+            cls.terms = TermCounts(con.execute("select review, term, n from review_terms").to_arrow_table(),
+                                   con.execute("select word, banned, singular from terms").to_arrow_table(),
+                                   len(reviews))
+        finally:
+            con.close()
+        cls.index = ReviewIndex(reviews, ['author_name', 'category'])
+        cls.texts = reviews['clean_text'].to_pylist()
+        cls.banned = {w for a in cls.index.values['author_name'] for w in a.lower().split()} | set(EXTRA_BANNED_WORDS)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def expected(self, rows):
+        words = (w for r in rows if self.texts[r] is not None for w in self.texts[r].split())
+        return WordCloud(collocations=False).process_text(" ".join(w for w in words if w.lower() not in self.banned))
+
+    def test_matches_wordcloud(self):
+        authors = self.index.values['author_name']
+        categories = self.index.values['category']
+        selections = [
+            ({}, None),
+            ({'author_name': authors[:1]}, None),
+            ({'author_name': authors[::3]}, None),
+            ({'category': categories[:2]}, None),
+            ({'author_name': authors[:20], 'category': categories[:5]}, None),
+            ({}, ('2015-01-01', '2019-12-31')),
+        ]
+        for selection, date_range in selections:
+            rows = self.index.select(selection, date_range)
+            self.assertGreater(len(rows), 0, selection)
+            self.assertEqual(self.terms.frequencies(rows, max_words=len(self.terms.words)), self.expected(rows),
+                             (selection, date_range))
+
+    def test_plurals_and_banned_words(self):
+        counts = self.terms.frequencies(self.index.select({}), max_words=len(self.terms.words))
+        # "pages" is counted as "page", "glasses" has no "glasse" to go to, and
+        # "books" stays as it is since "book" is banned
+        self.assertIn('page', counts)
+        self.assertNotIn('pages', counts)
+        self.assertIn('glasses', counts)
+        self.assertIn('books', counts)
+        self.assertNotIn('book', counts)
+        self.assertNotIn('1984', counts)
+        self.assertFalse(self.banned & set(counts))
+
+    def test_max_words(self):
+        rows = self.index.select({})
+        counts = self.terms.frequencies(rows, max_words=10)
+        full = self.terms.frequencies(rows, max_words=len(self.terms.words))
+        self.assertEqual(len(counts), 10)
+        self.assertEqual(counts, dict(list(full.items())[:10]))
+        self.assertGreaterEqual(min(counts.values()), max(v for w, v in full.items() if w not in counts))
+
+    def test_empty_selection(self):
+        rows = self.index.select({'author_name': ['Nobody']})
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(self.terms.frequencies(rows), {})
+        self.assertEqual(self.expected(rows), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import math
+import random
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yearindex import YearIndex
+from topk import TopK
+
+KEYS = ['title', 'author_name']
+RANKS = {'total_sales': 'sales_rank', 'total_reviews': 'reviews_rank'}
+
+
+def make_books(seed, n_books=300, years=range(2000, 2016)):
+    # Skewed per-year totals of books, each in one of a few genres; review counts
+    # are small integers, so equal totals are common
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_books):
+        popularity = 1.0 / (i + 1) ** 0.8
+        for year in years:
+            if rng.random() < 0.6:
+                reviews = int(rng.poisson(40 * popularity))
+                sales = round(reviews * float(rng.uniform(2, 30)), 2)
+                rows.append((year, f'Title {i:03d}', f'Author {i % 41}', f'Genre {i % 4}', float(reviews), sales))
+    return pd.DataFrame(rows, columns=['year', 'title', 'author_name', 'genre', 'total_reviews', 'total_sales'])
+
+
+def rankings(books, by_genre):
+    # The pipeline's per-year lists: one row per key and year, ranked per measure
+    lists = ['genre', 'year'] if by_genre else ['year']
+    ranked = books.copy() if by_genre else books.assign(genre=None)
+    for measure, rank in RANKS.items():
+        ranked[rank] = ranked.groupby(lists)[measure].rank(method='first', ascending=False)
+    return ranked
+
+
+def expected(books, measure, year_range, k, genre=None):
+    # Brute force: exact totals of every key over the range, largest first, equal
+    # totals in key order
+    rows = books[books['year'].between(*year_range)]
+    if genre is not None:
+        rows = rows[rows['genre'] == genre]
+    totals = rows.groupby(KEYS, sort=True)[measure].agg(math.fsum)
+    order = np.lexsort((np.arange(len(totals)), -totals.to_numpy()))[:k]
+    return [(key, value) for key, value in zip(totals.index[order], totals.to_numpy()[order])]
+
+
+def found(top, measure):
+    return [((row.title, row.author_name), getattr(row, measure)) for row in top.itertuples()]
+
+
+class TopKTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.books = make_books(seed=7)
+        cls.top_all = TopK(YearIndex(cls.books, KEYS, list(RANKS)), rankings(cls.books, False), RANKS)
+        cls.top_genre = TopK(YearIndex(cls.books, KEYS, list(RANKS), partition='genre'),
+                             rankings(cls.books, True), RANKS, partition='genre')
+
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        genres = sorted(self.books['genre'].unique())
+        examined = []
+        for _ in range(900):
+            start = rng.randint(1998, 2015)
+            year_range = (start, rng.randint(start, 2017))
+            measure = rng.choice(list(RANKS))
+            k = rng.choice([1, 5, 10, 20])
+            genre = rng.choice([None] + genres)
+            top_k = self.top_all if genre is None else self.top_genre
+            top, n = top_k.top(measure, year_range, k, genre)
+            self.assertEqual(found(top, measure), expected(self.books, measure, year_range, k, genre),
+                             (measure, year_range, k, genre))
+            self.assertGreaterEqual(n, len(top))
+            self.assertLessEqual(n, len(top_k.index.keys))
+            examined.append(n / len(top_k.index.keys))
+        # The threshold merge stops well before reading every key
+        self.assertLess(np.mean(examined), 0.5)
+
+    def test_ties_in_key_order(self):
+        # A, B, C and D all total 5 over the range; after E the top 3 keeps the first two keys
+        books = pd.DataFrame({
+            'year': [2001, 2001, 2001, 2001, 2001, 2002],
+            'title': ['D', 'B', 'C', 'A', 'E', 'A'],
+            'author_name': ['x', 'x', 'x', 'x', 'x', 'x'],
+            'total_reviews': [5.0, 5.0, 5.0, 2.0, 9.0, 3.0],
+            'total_sales': [1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
+        })
+        top_k = TopK(YearIndex(books, KEYS, list(RANKS)), rankings(books, False), RANKS)
+        top, n = top_k.top('total_reviews', (2001, 2002), 3)
+        self.assertEqual(found(top, 'total_reviews'), [(('E', 'x'), 9.0), (('A', 'x'), 5.0), (('B', 'x'), 5.0)])
+        self.assertEqual(n, 5)
+
+    def test_empty_range(self):
+        top, n = self.top_all.top('total_sales', (1900, 1950), 10)
+        self.assertTrue(top.empty)
+        self.assertEqual(n, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
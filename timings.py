@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import logging
+
+import streamlit as st
+
+# Set DASHBOARD_TIMINGS=1 to log the timings of every rerun; add ?timings to a
+# page's URL to log that session's reruns and show them in a panel as well
+ENV_VAR = 'DASHBOARD_TIMINGS'
+
+logger = logging.getLogger('dashboard.timings')
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class _Disabled:
+    # Stands in for a section when timing is off, so the instrumented code costs
+    # one method call and nothing else
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def note(self, **fields):
+        pass
+
+
+_DISABLED = _Disabled()
+
+
+class _Section:
+    def __init__(self, timer, name, fields):
+        self.timer = timer
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.sections.append({'section': self.name, 'seconds': time.perf_counter() - self.start, **self.fields})
+        return False
+
+    def note(self, **fields):
+        # Extra facts about the section, e.g. rows=... or cache='hit'
+        self.fields.update(fields)
+
+
+class RerunTimer:
+    # Times the named sections of one rerun of a page and logs them as one JSON line
+    def __init__(self, page):
+        self.page = page
+        self.panel = 'timings' in st.query_params
+        self.enabled = self.panel or os.environ.get(ENV_VAR, '') not in ('', '0')
+        self.sections = []
+        self.start = time.perf_counter()
+
+    def section(self, name, **fields):
+        if not self.enabled:
+            return _DISABLED
+        return _Section(self, name, fields)
+
+    def finish(self):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.start
+        logger.info(json.dumps({'page': self.page, 'total_s': round(total, 4), 'sections': [
+            {**s, 'seconds': round(s['seconds'], 4)} for s in self.sections]}, default=str))
+        if self.panel:
+            with st.expander(f"Rerun timings: {total:.3f}s", expanded=False):
+                rows = [{'section': s['section'], 'ms': round(s['seconds'] * 1000, 1),
+                         **{k: v for k, v in s.items() if k not in ('section', 'seconds')}} for s in self.sections]
+                st.dataframe(rows, use_container_width=True)
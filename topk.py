@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class TopK:
+    # Exact top-k keys of a YearIndex over a year range, found with the threshold
+    # algorithm. `ranked` holds the pipeline's per-year rankings (one row per key
+    # and year, with a rank column per measure). Each year of the range is a list
+    # sorted by that year's value; the lists are read in growing blocks, every key
+    # met is totalled over the whole range by the index, and reading stops once
+    # the k-th best total is above what any key not met yet could still reach
+    # (the sum of the next unread value of every list).
+    def __init__(self, index, ranked, ranks, partition=None):
+        key_cols = list(index.keys.columns)
+        codes = index.keys.assign(code=np.arange(len(index.keys)))
+        ranked = ranked.merge(codes, on=key_cols)
+        list_cols = ([partition] if partition else []) + ['year']
+
+        self.index = index
+        self._lists = {}
+        for measure, rank_col in ranks.items():
+            ordered = ranked.sort_values(list_cols + [rank_col]).reset_index(drop=True)
+            bounds = ordered.groupby(list_cols, sort=False, observed=True).indices
+            self._lists[measure] = (
+                ordered['code'].to_numpy(np.int64),
+                np.clip(np.nan_to_num(ordered[measure].to_numpy(np.float64)), 0, None),
+                {key: (idx[0], idx[-1] + 1) for key, idx in bounds.items()},
+            )
+
+    def top(self, measure, year_range, k, part=None):
+        # Returns (top rows as YearIndex.totals gives them, number of keys examined).
+        # Equal totals are ordered by key code, the order of index.keys: what a stable
+        # sort of the full totals gives. The totals are exact sums, so keys whose rows
+        # add up to the same amount always tie.
+        codes, scores, bounds = self._lists[measure]
+        lists = []
+        for year in range(year_range[0], year_range[1] + 1):
+            key = year if part is None else (part, year)
+            if key in bounds:
+                lists.append(bounds[key])
+
+        seen = np.empty(0, dtype=np.int64)
+        depth, block = 0, k
+        while True:
+            threshold, exhausted = 0.0, True
+            read = [seen]
+            for start, end in lists:
+                lo, hi = min(start + depth, end), min(start + depth + block, end)
+                read.append(codes[lo:hi])
+                # Keys not met yet are further down every list, so they score at most its next
+                # value; an exhausted list bounds nothing, keys not in it have nothing that year
+                if hi < end:
+                    threshold += scores[hi]
+                    exhausted = False
+            seen = np.unique(np.concatenate(read))
+            depth += block
+            block *= 2
+
+            totals = self.index.sums(year_range, seen, measure)
+            best = np.argsort(-totals, kind='stable')[:k]
+            if exhausted or (len(best) == k and totals[best[-1]] > threshold):
+                return self.index.totals(year_range, part, codes=seen[best]), len(seen)
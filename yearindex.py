@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+
+def _two_sum(a, b):
+    # a + b rounded, and the rounding error: their sum is exactly a + b
+    total = a + b
+    b_part = total - a
+    return total, (a - (total - b_part)) + (b - b_part)
+
+
+class YearIndex:
+    # Running totals of an aggregate per key, ordered by (key, year). The total of
+    # any key over a year range is the difference of two running totals, found
+    # with a binary search, so no rows are scanned or copied. Plain running totals
+    # grow far larger than any one key's sum and their difference loses the cents,
+    # so each one carries the rounding error of every addition before it (exact,
+    # by TwoSum): the difference is then as exact as summing the rows. With a
+    # partition column (e.g. genre) the keys of each partition are contiguous and
+    # can be answered on their own.
+    def __init__(self, df, keys, values, partition=None):
+        key_cols = ([partition] if partition else []) + list(keys)
+        df = df.dropna(subset=key_cols)
+        grouped = df.groupby(key_cols, sort=True, observed=True)
+        codes = grouped.ngroup().to_numpy()
+        years = df['year'].to_numpy(dtype=np.int64)
+        order = np.lexsort((years, codes))
+
+        self.keys = grouped.size().index.to_frame(index=False)
+        self.values = list(values)
+        self._min_year = int(years.min()) if len(years) else 0
+        self._max_year = int(years.max()) if len(years) else -1
+        self._span = self._max_year - self._min_year + 1
+        self._composite = codes[order] * self._span + (years[order] - self._min_year)
+        # np.cumsum adds in order, so the error of each step can be recovered from its result
+        self._prefix, self._error = {}, {}
+        for v in self.values:
+            rows = np.nan_to_num(df[v].to_numpy(dtype=np.float64)[order])
+            prefix = np.concatenate([[0.0], np.cumsum(rows)])
+            self._prefix[v] = prefix
+            self._error[v] = np.concatenate([[0.0], np.cumsum(_two_sum(prefix[:-1], rows)[1])])
+        self._partitions = {}
+        if partition:
+            part_codes = self.keys.groupby(partition, sort=False, observed=True).indices
+            self._partitions = {p: (idx[0], idx[-1] + 1) for p, idx in part_codes.items()}
+
+    def totals(self, year_range, part=None, codes=None):
+        # One row per key with any rows in the range: summed values plus `rows`, the number of rows summed.
+        # `codes` (positions in self.keys) looks up just those keys instead of a whole partition.
+        if codes is None:
+            if part is not None:
+                first, last = self._partitions.get(part, (0, 0))
+            else:
+                first, last = 0, len(self.keys)
+            codes = np.arange(first, last)
+        lo, hi = self._bounds(year_range, codes)
+        hit = hi > lo
+        if not hit.any():
+            return self._empty()
+        lo, hi = lo[hit], hi[hit]
+
+        result = self.keys.iloc[codes[hit]].reset_index(drop=True)
+        for v in self.values:
+            result[v] = self._difference(v, lo, hi)
+        result['rows'] = hi - lo
+        return result
+
+    def sums(self, year_range, codes, value):
+        # Totals of one value for the given keys, 0 where a key has no rows in the range
+        lo, hi = self._bounds(year_range, codes)
+        return self._difference(value, lo, hi)
+
+    def _difference(self, value, lo, hi):
+        # Sum of the rows lo:hi, from the running totals and their errors
+        prefix, error = self._prefix[value], self._error[value]
+        total, rounding = _two_sum(prefix[hi], -prefix[lo])
+        return total + (rounding + (error[hi] - error[lo]))
+
+    def _bounds(self, year_range, codes):
+        # Prefix positions delimiting each key's rows within the range
+        start = max(year_range[0], self._min_year) - self._min_year
+        end = min(year_range[1], self._max_year) - self._min_year
+        if start > end:
+            empty = np.zeros(len(codes), dtype=np.int64)
+            return empty, empty
+        lo = np.searchsorted(self._composite, codes * self._span + start, side='left')
+        hi = np.searchsorted(self._composite, codes * self._span + end, side='right')
+        return lo, hi
+
+    def _empty(self):
+        result = self.keys.iloc[:0].copy()
+        for v in self.values:
+            result[v] = pd.Series(dtype=np.float64)
+        result['rows'] = pd.Series(dtype=np.int64)
+        return result
+
+
+class YearSlices:
+    # Rows ordered by (partition, year, *order): a year range of one partition is a
+    # contiguous, zero-copy slice located by binary search.
+    def __init__(self, df, partition=None, order=()):
+        sort_cols = ([partition] if partition else []) + ['year'] + list(order)
+        self.frame = df.sort_values(sort_cols, kind='stable').reset_index(drop=True)
+        self._years = self.frame['year'].to_numpy()
+        if partition:
+            bounds = self.frame.groupby(partition, sort=False, observed=True).indices
+            self._partitions = {p: (idx[0], idx[-1] + 1) for p, idx in bounds.items()}
+        else:
+            self._partitions = None
+
+    def rows(self, year_range, part=None):
+        if self._partitions is not None:
+            first, last = self._partitions.get(part, (0, 0))
+        else:
+            first, last = 0, len(self.frame)
+        years = self._years[first:last]
+        lo = first + np.searchsorted(years, year_range[0], side='left')
+        hi = first + np.searchsorted(years, year_range[1], side='right')
+        return self.frame.iloc[lo:hi]